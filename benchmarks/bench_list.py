@@ -0,0 +1,111 @@
+"""
+对比列表页逐字段调用get_value和编译后的序列化函数的速度，表有50个字段
+运行：python benchmarks/bench_list.py
+"""
+import asyncio
+import copy
+import datetime
+import os
+import sys
+import time
+from enum import IntEnum
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("FASTAPI_SETTINGS_MODULE", "tests.settings")
+
+from starlette.requests import Request  # noqa: E402
+from tortoise import Tortoise, fields  # noqa: E402
+from tortoise.models import Model  # noqa: E402
+
+from fast_tmp.conf import settings  # noqa: E402
+from fast_tmp.site import ModelAdmin  # noqa: E402
+
+
+class Level(IntEnum):
+    low = 0
+    middle = 1
+    high = 2
+
+
+# 每种类型的字段各10个
+FIELD_TYPES = {
+    "char": lambda: fields.CharField(max_length=32),
+    "int": lambda: fields.IntField(),
+    "date": lambda: fields.DateField(),
+    "datetime": lambda: fields.DatetimeField(),
+    "enum": lambda: fields.IntEnumField(Level),
+}
+attrs = {"__module__": __name__}
+for type_name, make_field in FIELD_TYPES.items():
+    for i in range(10):
+        attrs[f"{type_name}_{i}"] = make_field()
+Wide = type("Wide", (Model,), attrs)
+
+
+class WideModel(ModelAdmin):
+    model = Wide
+    list_display = tuple(name for name in attrs if name != "__module__")
+
+
+async def serialize_old(page_model: ModelAdmin, request: Request, datas):
+    """
+    编译之前的实现
+    """
+    res = []
+    for i in datas:
+        ret = {}
+        for field_name, field in page_model.get_list_display_with_pk().items():
+            if field._many:
+                continue
+            ret[field_name] = await field.get_value(request, i)
+        res.append(ret)
+    return res
+
+
+async def main(rows: int = 1000, rounds: int = 5):
+    config = copy.deepcopy(settings.TORTOISE_ORM)
+    config["apps"]["bench"] = {"models": [__name__], "default_connection": "default"}
+    await Tortoise.init(config=config)
+    await Tortoise.generate_schemas()
+    try:
+        now = datetime.datetime.now()
+        values = {
+            "char": lambda i: f"value{i}",
+            "int": lambda i: i,
+            "date": lambda i: now.date(),
+            "datetime": lambda i: now,
+            "enum": lambda i: Level(i % 3),
+        }
+        await Wide.bulk_create(
+            [
+                Wide(
+                    **{
+                        f"{type_name}_{j}": values[type_name](i)
+                        for type_name in FIELD_TYPES
+                        for j in range(10)
+                    }
+                )
+                for i in range(rows)
+            ]
+        )
+        datas = await Wide.all()
+        page_model = WideModel(prefix="wide")
+        request = Request({"type": "http", "method": "GET", "query_string": b"", "headers": []})
+        assert await serialize_old(page_model, request, datas) == await page_model.get_list_items(
+            request, datas
+        )
+        for name, func in (
+            ("get_value", lambda: serialize_old(page_model, request, datas)),
+            ("RowSerializer", lambda: page_model.get_list_items(request, datas)),
+        ):
+            start = time.perf_counter()
+            for _ in range(rounds):
+                await func()
+            cost = time.perf_counter() - start
+            print(f"{name:14} {rows * rounds / cost:10.0f} rows/s")
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
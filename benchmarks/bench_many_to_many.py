@@ -0,0 +1,102 @@
+"""
+对比多对多字段保存时嵌套循环比较关联对象和比较中间表主键集合的速度
+旧的实现是O(n*m)，只在较小的数据量上运行
+运行：python benchmarks/bench_many_to_many.py
+"""
+import asyncio
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("FASTAPI_SETTINGS_MODULE", "tests.settings")
+
+from starlette.requests import Request  # noqa: E402
+from tortoise import Tortoise, fields  # noqa: E402
+from tortoise.models import Model  # noqa: E402
+
+from fast_tmp.conf import settings  # noqa: E402
+from fast_tmp.site import ModelAdmin  # noqa: E402
+
+
+class Member(Model):
+    name = fields.CharField(max_length=32)
+
+
+class Club(Model):
+    name = fields.CharField(max_length=32)
+    members = fields.ManyToManyField("bench.Member", related_name="clubs")
+
+
+class ClubModel(ModelAdmin):
+    model = Club
+    list_display = ("name",)
+    update_fields = ("name", "members")
+
+
+async def update_old(page_model: ModelAdmin, request: Request, pk, data):
+    """
+    修改之前的实现
+    """
+    obj = await page_model.model.filter(pk=pk).prefetch_related("members").first()
+    obj.name = data["name"]
+    value = await Member.filter(pk__in=[i["value"] for i in data["members"]])
+    field = obj.members
+    add_field = []
+    remove_field = []
+    for i in field:
+        for j in value:
+            if j.pk == i.pk:
+                break
+        else:
+            remove_field.append(i)
+    for j in value:
+        for i in field:
+            if j.pk == i.pk:
+                break
+        else:
+            add_field.append(j)
+    if len(remove_field) > 0:
+        await field.remove(*remove_field)
+    if len(add_field) > 0:
+        await field.add(*add_field)
+    await obj.save()
+
+
+async def run(page_model: ModelAdmin, request: Request, rows: int, change: int, old: bool):
+    members = await Member.all().limit(rows + change).values_list("id", flat=True)
+    club = await Club.create(name="club")
+    await page_model.fields["members"].save_related_pks(club, members[:rows])
+    # 去掉前change个成员，再加入change个新成员
+    data = {"name": "club", "members": [{"value": i} for i in members[change:]]}
+    start = time.perf_counter()
+    if old:
+        await update_old(page_model, request, club.pk, data)
+    else:
+        await page_model.update(request, club.pk, data)
+    cost = time.perf_counter() - start
+    assert sorted(await club.members.all().values_list("id", flat=True)) == members[change:]
+    print(f"{'nested loop' if old else 'pk set':12} {rows:6} rows {cost * 1000:10.1f} ms")
+
+
+async def main(change: int = 1000):
+    config = copy.deepcopy(settings.TORTOISE_ORM)
+    config["apps"]["bench"] = {"models": [__name__], "default_connection": "default"}
+    await Tortoise.init(config=config)
+    await Tortoise.generate_schemas()
+    try:
+        await Member.bulk_create(
+            [Member(name=f"member{i}") for i in range(50000 + change)], batch_size=10000
+        )
+        page_model = ClubModel(prefix="club")
+        request = Request({"type": "http", "method": "PUT", "query_string": b"", "headers": []})
+        await run(page_model, request, 5000, change, True)
+        await run(page_model, request, 5000, change, False)
+        await run(page_model, request, 50000, change, False)
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
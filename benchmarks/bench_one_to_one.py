@@ -0,0 +1,82 @@
+"""
+对比一对一字段的选项查询，把已关联的主键读到python再not in和使用left join的速度，已关联100000行
+运行：python benchmarks/bench_one_to_one.py
+"""
+import asyncio
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("FASTAPI_SETTINGS_MODULE", "tests.settings")
+
+from starlette.requests import Request  # noqa: E402
+from tortoise import Tortoise, fields  # noqa: E402
+from tortoise.models import Model  # noqa: E402
+
+from fast_tmp.conf import settings  # noqa: E402
+from fast_tmp.site import ModelAdmin  # noqa: E402
+
+
+class Account(Model):
+    name = fields.CharField(max_length=32)
+
+    def __str__(self):
+        return self.name
+
+
+class Profile(Model):
+    account = fields.OneToOneField("bench.Account", related_name="profile")
+
+
+class ProfileModel(ModelAdmin):
+    model = Profile
+    list_display = ("account",)
+    update_fields = ("account",)
+
+
+async def select_old(page_model: ModelAdmin, request: Request):
+    """
+    修改之前的实现
+    """
+    field = page_model.fields["account"].field
+    exist_pks = await field.model.all().values(field.source_field)
+    data = await field.related_model.filter(
+        **{field.to_field + "__not_in": [i[field.source_field] for i in exist_pks]}
+    )
+    return {"options": [{"value": i.pk, "label": str(i)} for i in data]}
+
+
+async def main(rows: int = 100000, free: int = 10, rounds: int = 5):
+    config = copy.deepcopy(settings.TORTOISE_ORM)
+    config["apps"]["bench"] = {"models": [__name__], "default_connection": "default"}
+    await Tortoise.init(config=config)
+    await Tortoise.generate_schemas()
+    try:
+        await Account.bulk_create(
+            [Account(name=f"account{i}") for i in range(rows + free)], batch_size=10000
+        )
+        await Profile.bulk_create(
+            [Profile(account_id=i + 1) for i in range(rows)], batch_size=10000
+        )
+        page_model = ProfileModel(prefix="profile")
+        request = Request({"type": "http", "method": "GET", "query_string": b"", "headers": []})
+        options = (await page_model.select_options(request, "account", None, None, None))["options"]
+        assert options == (await select_old(page_model, request))["options"]
+        assert len(options) == free
+        for name, func in (
+            ("not in", lambda: select_old(page_model, request)),
+            ("left join", lambda: page_model.select_options(request, "account", None, None, None)),
+        ):
+            start = time.perf_counter()
+            for _ in range(rounds):
+                await func()
+            cost = time.perf_counter() - start
+            print(f"{name:10} {cost / rounds * 1000:10.1f} ms")
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
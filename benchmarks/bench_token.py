@@ -0,0 +1,38 @@
+"""
+对比token解析缓存前后的耗时
+运行：python benchmarks/bench_token.py
+"""
+import os
+import sys
+import timeit
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("FASTAPI_SETTINGS_MODULE", "tests.settings")
+
+from jose import jwt  # type: ignore # noqa: E402
+
+from fast_tmp.utils.token import (  # noqa: E402
+    ALGORITHM,
+    SECRET_KEY,
+    create_access_token,
+    decode_access_token,
+    token_cache,
+)
+
+
+def main(number: int = 20000):
+    token = create_access_token(data={"sub": "admin", "id": 1}, expires_delta=timedelta(minutes=10))
+    uncached = timeit.timeit(
+        lambda: jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]), number=number
+    )
+    token_cache.clear()
+    cached = timeit.timeit(lambda: decode_access_token(token), number=number)
+    print(f"jose.jwt.decode:      {uncached / number * 1e6:8.2f} us/op")
+    print(f"decode_access_token:  {cached / number * 1e6:8.2f} us/op")
+    print(f"speedup:              {uncached / cached:8.1f}x")
+    print(f"cache hits/misses:    {token_cache.hits}/{token_cache.misses}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,58 @@ from typing import Optional
 
 from fastapi import Cookie, Depends
 from starlette.requests import Request
+from starlette.responses import Response
+from tortoise.signals import post_delete, post_save
 
+from fast_tmp.conf import settings
+from fast_tmp.contrib.auth.permissions import make_perm_claim, rbac_version, read_perm_claim
 from fast_tmp.exceptions import NoAuthError
 from fast_tmp.models import User
-from fast_tmp.utils.token import decode_access_token
+from fast_tmp.utils.backends import get_backend
+from fast_tmp.utils.cache import TTLCache
+from fast_tmp.utils.token import create_access_token, decode_access_token
+
+USER_VERSION = "user"
+
+# 缓存token对应的用户，key为(username, token的create_time, 用户版本号)
+user_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+# 用户版本号的存储，多个worker共享同一个版本号，没有配置USER_CACHE_BACKEND的时候不缓存
+user_backend = get_backend(settings.USER_CACHE_BACKEND)
+
+
+async def _invalidate_user(pk: int):
+    if user_backend is not None:
+        await user_backend.aincr_version(USER_VERSION)
+    user_cache.delete_where(lambda key, user: user.pk == pk)
+
+
+@post_save(User)
+async def _invalidate_saved_user(sender, instance: User, created, using_db, update_fields):
+    """
+    用户修改之后（修改密码、禁用等）刷新版本号，所有worker的缓存随之失效，保证token失效的判定及时生效
+    注意：通过User.filter().update()修改不会触发信号
+    """
+    await _invalidate_user(instance.pk)
+
+
+@post_delete(User)
+async def _invalidate_deleted_user(sender, instance: User, using_db):
+    await _invalidate_user(instance.pk)
+
+
+async def get_user(username: str, create_time: float) -> Optional[User]:
+    """
+    根据token信息获取用户，优先从缓存读取
+    """
+    if user_backend is None or settings.USER_CACHE_TTL <= 0:
+        return await User.filter(username=username).first()
+    key = (username, create_time, await user_backend.aget_version(USER_VERSION))
+    user = user_cache.get(key)
+    if user is None:
+        user = await User.filter(username=username).first()
+        if user is not None:
+            user_cache.set(key, user)
+    return user
 
 
 async def active_user_or_none(access_token: Optional[str] = Cookie(None)) -> Optional[User]:
@@ -22,7 +70,7 @@ async def active_user_or_none(access_token: Optional[str] = Cookie(None)) -> Opt
                 return None
         except Exception:
             return None
-        user = await User.filter(username=username).first()
+        user = await get_user(username, create_time)
         if (
             user is not None
             and user.is_active
@@ -33,10 +81,61 @@ async def active_user_or_none(access_token: Optional[str] = Cookie(None)) -> Opt
     return None
 
 
-async def get_staff(request: Request, user: Optional[User] = Depends(active_user_or_none)):
+async def create_user_token(user: User, expires_delta: datetime.timedelta) -> str:
+    """
+    生成用户的token，开启TOKEN_PERMISSION_CLAIM的时候会把用户权限写入token
+    """
+    data = {"sub": user.username, "id": user.pk}
+    if settings.TOKEN_PERMISSION_CLAIM and not user.is_superuser:
+        version = await rbac_version()  # 需要在读取权限之前获取版本号
+        data["perm"] = make_perm_claim(await user.get_all_perms(), version)
+    return create_access_token(data=data, expires_delta=expires_delta)
+
+
+def set_token_cookie(response: Response, token: str, expires: int):
+    response.set_cookie("access_token", token, expires=expires)
+
+
+async def get_staff(
+    request: Request, response: Response, user: Optional[User] = Depends(active_user_or_none)
+):
     """
     found user and write to request
     """
     if not user or not user.is_staff:
         raise NoAuthError()
     request.scope["user"] = user
+    payload = decode_access_token(request.cookies["access_token"])
+    now = datetime.datetime.now().timestamp()
+    codenames = None
+    use_claim = settings.TOKEN_PERMISSION_CLAIM and not user.is_superuser
+    if use_claim:
+        codenames = await read_perm_claim(payload.get("perm"))
+    lifetime = payload["exp"] - payload["create_time"]
+    expires = 0
+    if (
+        settings.ACCESS_TOKEN_REFRESH_RATIO > 0
+        and now - payload["create_time"] > lifetime * settings.ACCESS_TOKEN_REFRESH_RATIO
+    ):  # token已经使用超过一定比例，签发新的token，避免用户重新登录
+        expires = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    elif use_claim and codenames is None:  # 权限版本已经变化，从数据库读取权限并重新签发token
+        expires = int(payload["exp"] - now)
+    if expires > 0:
+        # 签发新token之前从数据库重新读取用户，缓存中的用户可能已经被禁用或者修改过密码
+        # 否则新token的create_time晚于修改时间，缓存过期之后也会一直有效
+        user = await User.filter(pk=user.pk).first()
+        if (
+            user is None
+            or not user.is_active
+            or not user.is_staff
+            or user.update_time.timestamp() > payload["create_time"]
+        ):
+            user_cache.delete_where(lambda key, cached: cached.username == payload["sub"])
+            raise NoAuthError()
+        request.scope["user"] = user
+        token = await create_user_token(user, datetime.timedelta(seconds=expires))
+        set_token_cookie(response, token, expires)
+        if use_claim:
+            codenames = await read_perm_claim(decode_access_token(token).get("perm"))
+    if codenames is not None:
+        request.state.codenames = codenames
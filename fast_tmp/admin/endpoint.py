@@ -38,13 +38,15 @@ async def select_view(
     pk: Optional[str] = None,
     perPage: Optional[int] = None,
     page: Optional[int] = None,
+    term: Optional[str] = None,
     page_model: ModelSession = Depends(get_model_site),
 ):
     """
     枚举字段的额外加载，主要用于外键
+    term: 搜索的关键字
     """
     await page_model.check_perm(request, prefix + "_list")
-    datas = await page_model.select_options(request, field_name, pk, perPage, page)
+    datas = await page_model.select_options(request, field_name, pk, perPage, page, term)
     return AdminRes(data=datas)
 
 
@@ -64,6 +66,21 @@ async def patch_data(
     return AdminRes().dict()
 
 
+@router.post("/{prefix}/patch", dependencies=[Depends(get_staff)])
+async def patch_many_data(
+    request: Request,
+    prefix: str,
+    page_model: ModelSession = Depends(get_model_site),
+):
+    """
+    内联模式批量保存需要的接口，数据为amis的rowsDiff
+    """
+    await page_model.check_perm(request, prefix + "_update")
+    data = await request.json()
+    await page_model.patch_many(request, data.get("rowsDiff", []))
+    return AdminRes().dict()
+
+
 @router.put("/{prefix}/update/{pk}", dependencies=[Depends(get_staff)])
 async def update_data(
     request: Request,
@@ -111,6 +128,22 @@ async def delete_func(
     return AdminRes()
 
 
+@router.post("/{prefix}/bulk/{action}", dependencies=[Depends(get_staff)])
+async def bulk_action(
+    request: Request,
+    prefix: str,
+    action: str,
+    page_model: ModelSession = Depends(get_model_site),
+):
+    """
+    批量操作，查询参数ids为选中的主键，all为true的时候操作所有符合过滤条件的数据
+    """
+    await page_model.check_perm(request, prefix + ("_delete" if action == "delete" else "_update"))
+    data = await request.json() if await request.body() else {}
+    count = await page_model.bulk_action(request, action, data)
+    return AdminRes(data={"count": count})
+
+
 @router.get("/{prefix}/schema", dependencies=[Depends(get_staff)])
 async def get_schema(
     request: Request,
@@ -1,6 +1,6 @@
 import os
 from datetime import timedelta
-from typing import Optional
+from typing import List, Optional
 
 from fastapi import BackgroundTasks, Depends, FastAPI, Form, Request
 from fastapi.templating import Jinja2Templates
@@ -10,14 +10,15 @@ from tortoise.exceptions import BaseORMException
 
 from fast_tmp.admin.site import GroupAdmin, OperateRecordAdmin, PermissionAdmin, UserAdmin, UserInfo
 from fast_tmp.conf import settings
+from fast_tmp.contrib.auth.permissions import get_codenames
 from fast_tmp.exceptions import FastTmpError, NoAuthError
-from fast_tmp.models import OperateRecord, Permission, User
+from fast_tmp.models import OperateRecord, User
 from fast_tmp.responses import AdminRes
 from fast_tmp.site import model_list, register_model_site
-from fast_tmp.utils.token import create_access_token
 
 from ..jinja_extension.tags import register_tags
-from .depends import get_staff
+from . import throttle as login_throttle
+from .depends import create_user_token, get_staff, set_token_cookie
 from .endpoint import router
 from .exception_handlers import (
     auth_exception_handler,
@@ -81,22 +82,36 @@ async def login(
     if not password:
         context["password_err"] = True
         return templates.TemplateResponse("login.html", context)
-    user = await User.filter(username=username, is_staff=True, is_active=True).first()
-    if not user or not user.check_password(password) or not user.is_active:
+    throttle = login_throttle.login_throttle
+    ip = request.client.host if request.client else ""
+    if throttle is not None and (not await throttle.allow(username, ip) or not throttle.acquire()):
+        context["errinfo"] = "too many login attempts, please try again later!"
+        return templates.TemplateResponse(
+            "login.html", context, status_code=status.HTTP_429_TOO_MANY_REQUESTS
+        )
+    try:
+        user = await User.filter(username=username, is_staff=True, is_active=True).first()
+        outdated: List[str] = []  # 密码正确但是哈希需要更新
+        is_correct = user is not None and await user.acheck_password(password, outdated.append)
+    finally:
+        if throttle is not None:
+            throttle.release()
+    if not user or not is_correct or not user.is_active:
+        if throttle is not None:
+            await throttle.fail(username, ip)
         context["errinfo"] = "username or password error!"
         return templates.TemplateResponse("login.html", context)
 
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username, "id": user.pk},
-        expires_delta=access_token_expires,
-    )
+    access_token = await create_user_token(user, access_token_expires)
     res = RedirectResponse(
         request.url_for("admin:index"),
         status_code=status.HTTP_302_FOUND,
     )
-    res.set_cookie("access_token", access_token, expires=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+    set_token_cookie(res, access_token, settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
     background_task.add_task(OperateRecord.login, user)
+    if outdated:
+        background_task.add_task(user.rehash_password, password)
     return res
 
 
@@ -130,10 +145,7 @@ async def get_site(request: Request):
     index_page = None
     user = request.user
     if not user.is_superuser:
-        perms = [
-            i.codename
-            for i in await Permission.filter(groups__users=user, codename__endswith="list")
-        ]
+        perms = await get_codenames(request)
         for name, ml in model_list.items():
             ml_p = []
             for model in ml:
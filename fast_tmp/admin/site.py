@@ -1,7 +1,8 @@
-from typing import Iterable, List, Optional, Union
+from typing import Any, Dict, Iterable, List, Optional, Union
 
 from starlette.requests import Request
 from starlette.responses import Response
+from tortoise.models import Model
 
 from fast_tmp.admin.depends import active_user_or_none
 from fast_tmp.amis.actions import AjaxAction
@@ -11,14 +12,35 @@ from fast_tmp.amis.formitem import FormItem
 from fast_tmp.amis.forms import Form
 from fast_tmp.amis.page import Page
 from fast_tmp.amis.view.divider import Divider
+from fast_tmp.contrib.auth.permissions import bump_rbac_version
 from fast_tmp.exceptions import NoAuthError, NotFoundError
 from fast_tmp.models import Group, OperateRecord, Permission, User
 from fast_tmp.responses import AdminRes, ListDataWithPage
-from fast_tmp.site import ModelAdmin
+from fast_tmp.site import ModelAdmin, list_data, paginate
 from fast_tmp.site.field import Password
 
 
-class UserAdmin(ModelAdmin):
+class RbacModelAdmin(ModelAdmin):
+    """
+    组、权限以及用户所属的组被修改之后，刷新所有worker的权限缓存
+    """
+
+    async def create(self, request: Request, data: Dict[str, Any]) -> Model:
+        obj = await super().create(request, data)
+        await bump_rbac_version()
+        return obj
+
+    async def update(self, request: Request, pk: str, data: Dict[str, Any]) -> Model:
+        obj = await super().update(request, pk, data)
+        await bump_rbac_version()
+        return obj
+
+    async def delete(self, request: Request, pk: str):
+        await super().delete(request, pk)
+        await bump_rbac_version()
+
+
+class UserAdmin(RbacModelAdmin):
     model = User
     list_display = ("id", "name", "username", "is_active", "is_superuser", "is_staff")
     ordering = ("id", "name", "username")
@@ -44,21 +66,27 @@ class UserAdmin(ModelAdmin):
     fields = {
         "password": Password(label="密码", name="password", null=True, default="")
     }  # type: ignore
+    label_fields = {"groups": "name"}
+    select_search_fields = {"groups": ("name",)}
 
 
-class GroupAdmin(ModelAdmin):
+class GroupAdmin(RbacModelAdmin):
     model = Group
     list_display = ("name", "users", "permissions")
     ordering = ("name",)
     create_fields = ("name", "users", "permissions")
     update_fields = ("name", "users", "permissions")
+    label_fields = {"users": "name", "permissions": "label"}
+    select_search_fields = {"users": ("username", "name"), "permissions": ("codename", "label")}
 
 
-class PermissionAdmin(ModelAdmin):
+class PermissionAdmin(RbacModelAdmin):
     model = Permission
     list_display = ("label", "codename", "groups")
     create_fields = ("label", "codename", "groups")
     update_fields = ("label", "codename", "groups")
+    label_fields = {"groups": "name"}
+    select_search_fields = {"groups": ("name",)}
 
     def get_create_dialogation_button(
         self, request: Request, codenames: Iterable[str]
@@ -101,14 +129,13 @@ class OperateRecordAdmin(ModelAdmin):
             queryset = OperateRecord.all()
         else:
             queryset = OperateRecord.filter(user=user)
-        count = await queryset.count()
+        base_queryset = queryset
         queryset = queryset.select_related("user")
         if orderBy and orderBy in self.ordering:
             queryset = queryset.order_by("-" + orderBy if orderDir == "desc" else orderBy)
-        datas = await queryset.limit(perPage).offset((page - 1) * perPage)
-        return ListDataWithPage(
-            total=count,
-            items=[
+        datas, total, approximate = await paginate(queryset, base_queryset, perPage, page)
+        return list_data(
+            [
                 {
                     "pk": data.pk,
                     "user": {"label": str(data.user), "value": str(data.user)},
@@ -119,6 +146,8 @@ class OperateRecordAdmin(ModelAdmin):
                 }
                 for data in datas
             ],
+            total,
+            approximate,
         )
 
 
@@ -143,20 +172,12 @@ class UserInfo(ModelAdmin):
         base_queryset = self.queryset(request)
         base_queryset = self.queryset_filter(request, base_queryset)
         base_queryset = base_queryset.filter(user=request.user)  # 只读取自己的数据
-        queryset = self.prefetch(request, base_queryset, self.get_list_distplay())
+        queryset = self.prefetch(request, base_queryset, self.get_list_prefetch_fields())
         if orderBy and orderBy in self.ordering:
             queryset = queryset.order_by("-" + orderBy if orderDir == "desc" else orderBy)
-        datas = await queryset.limit(perPage).offset((page - 1) * perPage)
-        res = []
-        for i in datas:
-            ret = {}
-            for field_name, field in self.get_list_display_with_pk().items():
-                if field._many:
-                    continue
-                ret[field_name] = await field.get_value(request, i)
-            res.append(ret)
-        count = await base_queryset.count()
-        return ListDataWithPage(total=count, items=res)
+        datas, total, approximate = await paginate(queryset, base_queryset, perPage, page)
+        res = await self.get_list_items(request, datas)
+        return list_data(res, total, approximate)
 
     async def get_app_page(self, request: Request) -> Union[Page, dict]:
         return Page(
@@ -207,7 +228,7 @@ class UserInfo(ModelAdmin):
                 if data.get("name"):
                     user.name = data["name"]
                 if data.get("password"):
-                    user.set_password(data["password"])
+                    await user.aset_password(data["password"])
                 await user.save()
                 return AdminRes(msg="修改成功")
         raise NotFoundError("not found function.")
@@ -0,0 +1,86 @@
+"""
+登录限流
+按用户名和客户端ip分别建立令牌桶，密码错误的时候消耗令牌，令牌耗尽之后直接拒绝登录，不再进行密码校验。
+同时限制当前worker同时进行密码校验的数量，超出的请求直接拒绝而不是排队。
+后端的读写可能会阻塞（sqlite等待文件锁），所以放到线程池中执行，不占用事件循环。
+ip的令牌桶默认关闭：ip取自request.client.host，部署在反向代理后面的时候所有请求的ip都是代理的地址，
+需要让uvicorn信任代理转发的ip（--proxy-headers --forwarded-allow-ips）之后再开启。
+"""
+import asyncio
+from typing import Optional
+
+from fast_tmp.conf import settings
+from fast_tmp.utils.backends import StateBackend, get_backend
+
+
+class LoginThrottle:
+    def __init__(
+        self,
+        backend: StateBackend,
+        username_burst: int = 5,
+        username_per_minute: float = 5,
+        ip_burst: int = 0,
+        ip_per_minute: float = 20,
+        max_verifying: int = 8,
+    ):
+        self.backend = backend
+        self.username_burst = username_burst
+        self.username_rate = username_per_minute / 60
+        self.ip_burst = ip_burst
+        self.ip_rate = ip_per_minute / 60
+        self.max_verifying = max_verifying
+        self.verifying = 0
+
+    def _allow(self, username: str, ip: str) -> bool:
+        user_key = "login_user:" + username
+        if self.backend.get_tokens(user_key, self.username_burst, self.username_rate) < 1:
+            return False
+        if self.ip_burst <= 0:
+            return True
+        return self.backend.get_tokens("login_ip:" + ip, self.ip_burst, self.ip_rate) >= 1
+
+    def _fail(self, username: str, ip: str):
+        self.backend.consume("login_user:" + username, self.username_burst, self.username_rate)
+        if self.ip_burst > 0:
+            self.backend.consume("login_ip:" + ip, self.ip_burst, self.ip_rate)
+
+    async def allow(self, username: str, ip: str) -> bool:
+        """
+        判断是否允许进行密码校验
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, self._allow, username, ip)
+
+    async def fail(self, username: str, ip: str):
+        """
+        登录失败，消耗令牌
+        """
+        await asyncio.get_running_loop().run_in_executor(None, self._fail, username, ip)
+
+    def acquire(self) -> bool:
+        """
+        获取密码校验的名额，获取失败则返回False
+        """
+        if self.verifying >= self.max_verifying:
+            return False
+        self.verifying += 1
+        return True
+
+    def release(self):
+        self.verifying -= 1
+
+
+def _make_throttle() -> Optional[LoginThrottle]:
+    backend = get_backend(settings.LOGIN_THROTTLE_BACKEND)
+    if backend is None:
+        return None
+    return LoginThrottle(
+        backend,
+        settings.LOGIN_USERNAME_BURST,
+        settings.LOGIN_USERNAME_PER_MINUTE,
+        settings.LOGIN_IP_BURST,
+        settings.LOGIN_IP_PER_MINUTE,
+        settings.LOGIN_MAX_VERIFYING,
+    )
+
+
+login_throttle = _make_throttle()
@@ -14,6 +14,9 @@ class CRUD(SchemaNode):
     columns: List[Union[Column, _Action, Operation, dict]]
     affixHeader: bool = False
     quickSaveItemApi: Optional[str]  # 快速保存
+    quickSaveApi: Optional[str]  # 批量保存，提交的rowsDiff中包含primaryField
+    primaryField: Optional[str]  # 主键字段，默认为id
+    bulkActions: Optional[List[_Action]]  # 批量操作，选中的主键用逗号拼接成${ids}
     syncLocation: Optional[bool]
     filter: Optional[Union[FilterModel, dict]]
 
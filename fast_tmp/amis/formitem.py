@@ -158,7 +158,7 @@ class SelectItem(FormItem):
     # 配置返回数组格式，具体参考https://baidu.gitee.io/amis/docs/components/form/
     # options#%E5%8A%A8%E6%80%81%E9%85%8D%E7%BD%AE
     searchable: Optional[bool]  # 前端对选项是否启动搜索功能
-    autoComplete: Optional[bool]  # 是否对选项启动自动补全
+    autoComplete: Optional[str]  # 自动补全的接口，输入的内容通过$term传递，设置之后远程搜索选项
     #  可以修改选项值的选择器
     creatable: Optional[bool]  # 是否支持新增选项
     addControls: Optional[Tuple[FormItem, ...]]  # 配置弹框信息
@@ -17,6 +17,12 @@ class Settings(BaseSettings):
     AUTH_USER_MODEL_NAME: str = "User"
     AUTH_APP_NAME: str = "fast_tmp"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # token过期时间
+    # token使用时间超过有效期的该比例之后自动续签，为0则不续签
+    ACCESS_TOKEN_REFRESH_RATIO: float = 0.5
+    TOKEN_CACHE_SIZE: int = 1024  # 已解析token的缓存数量，为0则不缓存
+    # 把用户权限写入token，权限判断不再查询数据库，权限版本变化之后重新签发token
+    # 需要配置PERMISSION_CACHE_BACKEND才能在多个worker之间感知权限的变化
+    TOKEN_PERMISSION_CLAIM: bool = False
     BACKEND_CORS_ORIGINS: List[AnyHttpUrl] = []
     FASTAPI_SETTINGS_MODULE: str = ""
     DEBUG: bool = True
@@ -26,6 +32,35 @@ class Settings(BaseSettings):
     MEDIA_ROOT = "media"
     MEDIA_PATH = "media"
     LOCAL_FILE: bool = False  # 是否使用本地amis静态文件
+    # 登录用户缓存的版本号存储，为空则不缓存，"memory"为单进程，"sqlite:///path"为多进程共享
+    # 使用"memory"部署多个worker时，用户被禁用或修改密码后其他worker最多USER_CACHE_TTL秒内仍然有效
+    USER_CACHE_BACKEND: str = ""
+    USER_CACHE_TTL: int = 60  # 登录用户的缓存时间（秒），为0则不缓存
+    USER_CACHE_SIZE: int = 1024  # 登录用户的最大缓存数量
+    # 用户权限缓存的版本号存储，为空则不缓存，"memory"为单进程，"sqlite:///path"为多进程共享
+    PERMISSION_CACHE_BACKEND: str = ""
+    PERMISSION_CACHE_SIZE: int = 4096  # 权限缓存的最大用户数
+    PERMISSION_CACHE_TTL: int = 3600  # 权限缓存的过期时间（秒）
+    PASSWORD_HASH_WORKERS: int = 2  # 同时进行密码哈希计算的线程数
+    PASSWORD_HASH_ITERATIONS: int = 480000  # PBKDF2的迭代次数，修改之后旧密码会在登录时更新
+    # 登录限流的状态存储，为空则不限流，"memory"为单进程，"sqlite:///path"为多进程共享
+    LOGIN_THROTTLE_BACKEND: str = "memory"
+    LOGIN_USERNAME_BURST: int = 5  # 单个用户名允许连续输错密码的次数
+    LOGIN_USERNAME_PER_MINUTE: float = 5  # 单个用户名每分钟恢复的次数
+    # 单个ip允许连续输错密码的次数，为0则不按ip限流
+    # ip取自request.client.host，部署在反向代理后面时需要先让uvicorn信任代理转发的ip再开启
+    LOGIN_IP_BURST: int = 0
+    LOGIN_IP_PER_MINUTE: float = 20  # 单个ip每分钟恢复的次数
+    LOGIN_MAX_VERIFYING: int = 8  # 单个worker同时进行密码校验的上限
+    LIST_COUNT_CACHE_TTL: int = 0  # 列表页总数的缓存时间（秒），为0则不缓存
+    LIST_COUNT_CACHE_SIZE: int = 1024  # 列表页总数的最大缓存数量
+    # 数据库统计信息中的行数超过该值时，列表页的总数使用估算值，为0则总是精确统计
+    LIST_COUNT_ESTIMATE_THRESHOLD: int = 0
+    # 检查列表页的查询数量，超出预加载计划时抛出异常，用于开发和测试时发现逐行查询的字段
+    # 开启后每次列表请求都会把tortoise.db_client日志调到DEBUG级别来计数，生产环境不要开启
+    LIST_QUERY_CHECK: bool = False
+    BULK_ACTION_CHUNK_SIZE: int = 1000  # 批量操作每条语句处理的行数
+    SELECT_PAGE_SIZE: int = 20  # 外键下拉框每次加载和搜索返回的选项数量，为0则不限制
 
     class Config:
         env_file = ".env"
@@ -1,3 +1,4 @@
+import asyncio
 import base64
 
 # import binascii
@@ -6,8 +7,10 @@ import hashlib
 import importlib
 import math
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Optional
 
+from fast_tmp.conf import settings
 from fast_tmp.utils.crypto import RANDOM_STRING_CHARS  # md5,
 from fast_tmp.utils.crypto import constant_time_compare, get_random_string, pbkdf2
 
@@ -75,6 +78,44 @@ def make_password(password, salt=None, hasher="default"):
     return hasher.encode(password, salt)
 
 
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_hash_executor() -> ThreadPoolExecutor:
+    """
+    密码哈希使用的线程池，线程数即同时进行哈希计算的上限
+    hashlib.pbkdf2_hmac在计算时会释放GIL，所以不会阻塞事件循环
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="fast_tmp_hasher"
+        )
+    return _executor
+
+
+async def acheck_password(password, encoded, setter=None, preferred="default"):
+    """
+    check_password的异步版本，在线程池里面进行计算
+    注意：setter会在线程池里面被调用
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_hash_executor(),
+        functools.partial(check_password, password, encoded, setter, preferred),
+    )
+
+
+async def amake_password(password, salt=None, hasher="default"):
+    """
+    make_password的异步版本，在线程池里面进行计算
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_hash_executor(), functools.partial(make_password, password, salt, hasher)
+    )
+
+
 @functools.lru_cache(maxsize=None)
 def get_hashers():
     # hashers = [PBKDF2PasswordHasher(), PBKDF2SHA1PasswordHasher, MD5PasswordHasher]
@@ -259,7 +300,7 @@ class PBKDF2PasswordHasher(BasePasswordHasher):
     """
 
     algorithm = "pbkdf2_sha256"
-    iterations = 480000
+    iterations = settings.PASSWORD_HASH_ITERATIONS  # 可使用fast-tmp calibrate-hasher测算
     digest = hashlib.sha256
 
     def encode(self, password, salt, iterations=None):
@@ -0,0 +1,145 @@
+"""
+用户权限缓存
+缓存的key为用户id和全局的权限版本号，组、权限发生变化的时候版本号加一，所有worker的缓存随之失效。
+通过PERMISSION_CACHE_BACKEND配置版本号的存储位置，为空则不缓存。
+注意：直接通过group.users.add()等方式修改多对多关系不会触发信号，需要手动调用await bump_rbac_version()
+"""
+import zlib
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, List, Optional, Tuple
+
+from starlette.requests import Request
+from tortoise.signals import post_delete, post_save
+
+from fast_tmp.conf import settings
+from fast_tmp.models import Group, Permission, User
+from fast_tmp.utils.backends import StateBackend, get_backend
+from fast_tmp.utils.cache import TTLCache
+
+RBAC_VERSION = "rbac"
+
+
+class PermissionCache:
+    def __init__(self, backend: StateBackend, maxsize: int = 4096, ttl: float = 3600):
+        self.backend = backend
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def version(self) -> int:
+        return await self.backend.aget_version(RBAC_VERSION)
+
+    def get(self, user_id: Hashable, version: int) -> Optional[FrozenSet[str]]:
+        return self._cache.get((user_id, version))
+
+    def set(self, user_id: Hashable, version: int, codenames: Iterable[str]):
+        """
+        version需要在查询数据库之前获取，避免把旧数据写入到新版本里面
+        """
+        self._cache.set((user_id, version), frozenset(codenames))
+
+    async def bump(self) -> int:
+        return await self.backend.aincr_version(RBAC_VERSION)
+
+
+def _make_cache() -> Optional[PermissionCache]:
+    backend = get_backend(settings.PERMISSION_CACHE_BACKEND)
+    if backend is None:
+        return None
+    return PermissionCache(backend, settings.PERMISSION_CACHE_SIZE, settings.PERMISSION_CACHE_TTL)
+
+
+permission_cache = _make_cache()
+
+
+async def bump_rbac_version():
+    """
+    组、权限或者用户所属的组被修改之后调用，使所有worker的权限缓存失效
+    """
+    if permission_cache is not None:
+        await permission_cache.bump()
+
+
+async def rbac_version() -> int:
+    """
+    当前的权限版本号，没有配置PERMISSION_CACHE_BACKEND的时候恒为0
+    """
+    if permission_cache is None:
+        return 0
+    return await permission_cache.version()
+
+
+_codename_index: Optional[Tuple[List[str], Dict[str, int], str]] = None
+
+
+def get_codename_index() -> Tuple[List[str], Dict[str, int], str]:
+    """
+    所有注册页面的权限码排序之后的列表，以及列表的摘要
+    各个worker注册的页面相同，所以得到的顺序也相同
+    """
+    global _codename_index
+    if _codename_index is None:
+        from fast_tmp.site import model_list
+
+        codenames = sorted(
+            {
+                f"{model.prefix}_{action}"
+                for models in model_list.values()
+                for model in models
+                for action in ("list", "create", "update", "delete")
+            }
+        )
+        digest = "%08x" % zlib.crc32(",".join(codenames).encode())
+        _codename_index = codenames, {c: i for i, c in enumerate(codenames)}, digest
+    return _codename_index
+
+
+def make_perm_claim(codenames: Iterable[str], version: int) -> Dict[str, Any]:
+    """
+    把权限码编码为位图，写入token
+    只有注册页面的权限码会被编码，其他自定义的权限码请通过user.has_perm判断
+    """
+    index_list, index, digest = get_codename_index()
+    bits = 0
+    for codename in codenames:
+        i = index.get(codename)
+        if i is not None:
+            bits |= 1 << i
+    return {"v": version, "i": digest, "b": "%x" % bits}
+
+
+async def read_perm_claim(claim: Any) -> Optional[FrozenSet[str]]:
+    """
+    从token的权限声明中读取权限码，声明不存在或者已经过期则返回None
+    """
+    if not isinstance(claim, dict):
+        return None
+    index_list, index, digest = get_codename_index()
+    if claim.get("i") != digest or claim.get("v") != await rbac_version():
+        return None
+    bits = int(claim["b"], 16)
+    return frozenset(c for i, c in enumerate(index_list) if bits >> i & 1)
+
+
+async def get_codenames(request: Request) -> FrozenSet[str]:
+    """
+    获取当前用户的所有权限码，同一个请求内只查询一次，结果保存在request.state
+    超级用户请在调用前自行判断
+    """
+    codenames = getattr(request.state, "codenames", None)
+    if codenames is None:
+        codenames = frozenset(await request.user.get_all_perms())
+        request.state.codenames = codenames
+    return codenames
+
+
+@post_save(Permission)
+async def _permission_saved(sender, instance, created, using_db, update_fields):
+    await bump_rbac_version()
+
+
+@post_save(Group)
+async def _group_saved(sender, instance, created, using_db, update_fields):
+    await bump_rbac_version()
+
+
+@post_delete(Permission, Group, User)
+async def _rbac_deleted(sender, instance, using_db):
+    await bump_rbac_version()
@@ -4,6 +4,12 @@ from typing import Set
 from tortoise import Model, fields
 
 
+def _permission_cache():
+    from fast_tmp.contrib.auth import permissions
+
+    return permissions.permission_cache
+
+
 class Permission(Model):
     """
     权限
@@ -49,6 +55,9 @@ class Permission(Model):
                 await cls.get_or_create(
                     codename=f"{prefix}_delete", defaults={"label": f"{name}_delete"}
                 )
+        from fast_tmp.contrib.auth.permissions import bump_rbac_version
+
+        await bump_rbac_version()
         return True
 
 
@@ -87,12 +96,39 @@ class User(Model):
 
         return check_password(raw_password, self.password)
 
+    async def aset_password(self, raw_password: str):
+        """
+        设置密码，哈希计算在线程池里面执行
+        """
+        from fast_tmp.contrib.auth.hashers import amake_password
+
+        self.password = await amake_password(raw_password)
+
+    async def acheck_password(self, raw_password: str, setter=None) -> bool:
+        """
+        验证密码，哈希计算在线程池里面执行
+        setter: 密码正确但是需要更新哈希的时候被调用，注意会在线程池里面调用
+        """
+        from fast_tmp.contrib.auth.hashers import acheck_password
+
+        return await acheck_password(raw_password, self.password, setter)
+
+    async def rehash_password(self, raw_password: str):
+        """
+        使用当前的哈希算法和迭代次数重新保存密码
+        不修改update_time，已经签发的token不会失效
+        """
+        await self.aset_password(raw_password)
+        await User.filter(pk=self.pk).update(password=self.password)
+
     async def has_perm(self, codename: str) -> bool:
         """
         判定用户是否有权限
         """
         if self.is_superuser and self.is_active:
             return True
+        if _permission_cache() is not None:
+            return codename in await self.get_all_perms()
         if await Group.filter(users__pk=self.pk, permissions__codename=codename).exists():
             return True
         return False
@@ -110,9 +146,30 @@ class User(Model):
         """
         if self.is_superuser:
             return codenames
+        if _permission_cache() is not None:
+            return codenames & await self.get_all_perms()
         perms = await Permission.filter(groups__users=self, codename__in=codenames)
         return set(i.codename for i in perms)
 
+    async def get_all_perms(self) -> Set[str]:
+        """
+        获取用户拥有的所有权限码
+        如果配置了PERMISSION_CACHE_BACKEND，则优先从缓存读取
+        """
+        cache = _permission_cache()
+        if cache is None:
+            return set(
+                await Permission.filter(groups__users=self).values_list("codename", flat=True)
+            )
+        version = await cache.version()
+        codenames = cache.get(self.pk, version)
+        if codenames is None:
+            codenames = frozenset(
+                await Permission.filter(groups__users=self).values_list("codename", flat=True)
+            )
+            cache.set(self.pk, version, codenames)
+        return set(codenames)
+
     def __str__(self):
         return self.name
 
@@ -8,6 +8,16 @@ class ListDataWithPage(BaseModel):  # 带分页的数据
     total: int = 0
 
 
+class ListDataWithEstimate(ListDataWithPage):  # 总数为根据数据库统计信息估算的值
+    approximate: bool = True
+
+
+class ListDataWithCursor(BaseModel):  # 游标分页的数据，不统计总数
+    items: List[dict]
+    hasNext: bool = False
+    cursor: str = ""  # 下一页的游标
+
+
 class AdminRes(BaseModel):
     status: int = 0
     msg: str = ""
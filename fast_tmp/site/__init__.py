@@ -1,11 +1,34 @@
+import asyncio
+import base64
+import datetime
+import json
 import logging
-from typing import Any, Callable, Coroutine, Dict, Iterable, List, Optional, Tuple, Type, Union
+import uuid
+from decimal import Decimal
+from enum import Enum
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Coroutine,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
 
 from starlette.requests import Request
-from tortoise import transactions
+from tortoise import timezone, transactions
 from tortoise.exceptions import ValidationError
+from tortoise.expressions import Q
 from tortoise.models import Model
+from tortoise.query_utils import Prefetch
 from tortoise.queryset import QuerySet
+from tortoise.signals import Signals
+from tortoise.utils import chunk
 
 from fast_tmp.amis.actions import AjaxAction, DialogAction
 from fast_tmp.amis.base import SchemaNode, _Action
@@ -16,16 +39,118 @@ from fast_tmp.amis.formitem import FormItem
 from fast_tmp.amis.forms import FilterModel, Form
 from fast_tmp.amis.frame import Dialog
 from fast_tmp.amis.page import Page
+from fast_tmp.conf import settings
+from fast_tmp.contrib.auth.permissions import get_codenames
 from fast_tmp.exceptions import FieldsError, NotFoundError, PermError, TmpValueError
-from fast_tmp.models import Permission
-from fast_tmp.responses import ListDataWithPage
-from fast_tmp.site.base import BaseControl, ModelFilter, ModelSession, PageRouter
-from fast_tmp.site.field import PkControl, RelationSelectApi, create_column
+from fast_tmp.responses import ListDataWithCursor, ListDataWithEstimate, ListDataWithPage
+from fast_tmp.site.base import (
+    BaseControl,
+    ModelFilter,
+    ModelSession,
+    PageRouter,
+    RowSerializer,
+    _get_owner,
+)
+from fast_tmp.site.field import (
+    ForeignKeyControl,
+    ManyToManyControl,
+    PkControl,
+    RelationSelectApi,
+    create_column,
+)
 from fast_tmp.site.filter import make_filter_by_str
+from fast_tmp.utils.cache import TTLCache
+from fast_tmp.utils.db import QueryCounter, estimate_count
 
 logger = logging.getLogger(__file__)
 
 
+def _cursor_default(value: Any) -> Any:
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f"can not use {type(value)} in cursor")
+
+
+def encode_cursor(page: int, values: List[Any]) -> str:
+    """
+    游标中记录生成游标的页码，以及该页最后一行的排序字段的值
+    """
+    data = json.dumps({"p": page, "v": values}, default=_cursor_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[int, List[Any]]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return data["p"], data["v"]
+    except Exception:
+        raise TmpValueError("cursor error")
+
+
+count_cache = TTLCache(maxsize=settings.LIST_COUNT_CACHE_SIZE)
+
+
+async def get_total(queryset: QuerySet) -> Tuple[int, bool]:
+    """
+    统计查询结果的总数，返回(总数, 是否为估算值)
+    缓存的key为count语句，相同的过滤条件共用一个缓存
+    """
+    key = None
+    if settings.LIST_COUNT_CACHE_TTL > 0:
+        key = (queryset.model._meta.db_table, queryset.count().sql())
+        total = count_cache.get(key)
+        if total is not None:
+            return total
+    total = None
+    threshold = settings.LIST_COUNT_ESTIMATE_THRESHOLD
+    if threshold > 0:
+        estimate = await estimate_count(queryset)
+        if estimate is not None and estimate >= threshold:
+            total = (estimate, True)
+    if total is None:
+        total = (await queryset.count(), False)
+    if key is not None:
+        count_cache.set(key, total, ttl=settings.LIST_COUNT_CACHE_TTL)
+    return total
+
+
+def clear_total(model: Type[Model]):
+    """
+    数据增删之后清除该表的总数缓存
+    """
+    table = model._meta.db_table
+    count_cache.delete_where(lambda key, value: key[0] == table)
+
+
+async def paginate(
+    queryset: QuerySet,
+    base_queryset: QuerySet,
+    perPage: int,
+    page: int,
+    values: Optional[Dict[str, str]] = None,
+) -> Tuple[List[Any], int, bool]:
+    """
+    查询当前页的数据，同时统计总数
+    两个查询不在事务中的时候会从连接池获取各自的连接并发执行
+    values: 投影查询的列，{别名: 字段}，为空则返回model对象
+    """
+    queryset = queryset.limit(perPage).offset((page - 1) * perPage)
+    datas, (total, approximate) = await asyncio.gather(
+        queryset.values(**values) if values else queryset, get_total(base_queryset)
+    )
+    return datas, total, approximate
+
+
+def list_data(items: List[dict], total: int, approximate: bool = False) -> ListDataWithPage:
+    if approximate:
+        return ListDataWithEstimate(items=items, total=total)
+    return ListDataWithPage(items=items, total=total)
+
+
 class ModelAdmin(ModelSession, PageRouter):  # todo inline字段必须都在update_fields内
     model: Type[Model]  # model
     list_display: Tuple[str, ...] = ()  # 页面展示的字段
@@ -34,6 +159,16 @@ class ModelAdmin(ModelSession, PageRouter):  # todo inline字段必须都在upda
     searchs: Tuple[str, ...] = ()  # todo
     filters: Tuple[Union[str, ModelFilter], ...] = ()  # 过滤字段的字典，字段名和对应的ModelFilter
     ordering: Tuple[str, ...] = ()  # 定义哪些字段支持排序
+    # 使用游标（keyset）分页，按照排序字段加主键翻页，不统计总数，适合数据量很大的表
+    # 排序字段的值不能为空
+    keyset_pagination = False
+    # 列表页只查询list_display需要的列和主键，不再加载完整的对象，适合字段很多的表
+    # 外键的标签读取label_fields中声明的关联表字段，未声明的外键会对当前页批量查询一次关联对象
+    list_projection = False
+    bulk_quick_save = False  # 内联修改之后不立即保存，修改多行之后一起提交
+    label_fields: Dict[str, str] = {}  # 关联字段作为标签的关联表字段，例如{"author": "name"}
+    # 关联字段的选项按关键字搜索的关联表字段，例如{"author": ("name", "email")}
+    select_search_fields: Dict[str, Tuple[str, ...]] = {}
     # create
     create_fields: Tuple[str, ...] = ()  # 创建页面的字段
     update_fields: Tuple[str, ...] = ()  # 更新页面的字段
@@ -44,8 +179,9 @@ class ModelAdmin(ModelSession, PageRouter):  # todo inline字段必须都在upda
         "create",
         "put",
         "delete",
-        # "deleteMany",
+        # "deleteMany",  # 批量删除
     )  # todo 需要retrieve？
+    bulk_update_fields: Tuple[str, ...] = ()  # 可以批量修改的字段，为空则没有批量修改
     _select_defs: Dict[
         str,
         Callable[
@@ -54,6 +190,8 @@ class ModelAdmin(ModelSession, PageRouter):  # todo inline字段必须都在upda
         ],
     ]  # 自定义的页面处理函数,从fields里面汇集
     _filters = None
+    _list_serializer: RowSerializer  # 列表页的序列化函数
+    _update_serializer: RowSerializer  # 编辑页的序列化函数
     _permissions: Optional[List[str]] = None
 
     def get_filters(self, request: Request) -> Dict[str, ModelFilter]:
@@ -86,7 +224,7 @@ class ModelAdmin(ModelSession, PageRouter):  # todo inline字段必须都在upda
         query = request.query_params
         filter_fs = self.get_filters(request)
         for k, v in query.items():
-            if k in ("pk", "page", "perPage"):
+            if k in ("pk", "page", "perPage", "cursor"):
                 continue
             func = filter_fs.get(k)
             if func is not None:
@@ -149,6 +287,8 @@ class ModelAdmin(ModelSession, PageRouter):  # todo inline字段必须都在upda
         for field_name, col in self.get_list_distplay().items():
             if field_name in self.inline:
                 column = col.get_column_inline(request)
+                if self.bulk_quick_save and getattr(column, "quickEdit", None):
+                    column.quickEdit.saveImmediately = False
             else:
                 column = col.get_column(request)
             if field_name in self.ordering:
@@ -192,6 +332,52 @@ class ModelAdmin(ModelSession, PageRouter):  # todo inline字段必须都在upda
             return Operation(buttons=buttons)
         return None
 
+    def get_bulk_api(self, request: Request, action: str, select_all: bool) -> str:
+        """
+        批量操作的接口，select_all为True的时候带上过滤条件，操作所有符合条件的数据
+        """
+        api = f"post:{self.prefix}/bulk/{action}?"
+        if not select_all:
+            return api + "ids=${ids|raw}"
+        return api + "&".join(["all=true"] + [f"{k}=${{{k}}}" for k in self.get_filters(request)])
+
+    def get_bulk_actions(self, request: Request, codenames: Iterable[str]) -> List[_Action]:
+        """
+        列表页的批量操作按钮，每种操作分为选中的数据和所有符合过滤条件的数据两种
+        """
+        actions: List[_Action] = []
+        for select_all, label in ((False, "选中"), (True, "全部筛选结果")):
+            if "deleteMany" in self.methods and self.prefix + "_delete" in codenames:
+                actions.append(
+                    AjaxAction(
+                        label=f"删除{label}",
+                        level=ButtonLevelEnum.danger,
+                        confirmText=f"确认要删除{label}？",
+                        api=self.get_bulk_api(request, "delete", select_all),
+                    )
+                )
+            if self.bulk_update_fields and self.prefix + "_update" in codenames:
+                body = [
+                    self.get_formitem_field(name)
+                    .get_formitem(request, codenames)
+                    .copy(update={"required": None, "value": None})
+                    for name in self.bulk_update_fields
+                ]
+                actions.append(
+                    DialogAction(
+                        label=f"修改{label}",
+                        dialog=Dialog(
+                            title=f"修改{label}",
+                            body=Form(
+                                name=f"批量修改{self.name}",
+                                body=body,
+                                api=self.get_bulk_api(request, "update", select_all),
+                            ),
+                        ),
+                    )
+                )
+        return actions
+
     def get_filter_page(self, request: Request):
         """
         页面上的过滤框
@@ -217,6 +403,15 @@ class ModelAdmin(ModelSession, PageRouter):  # todo inline字段必须都在upda
             quickSaveItemApi=self.prefix + "/patch/" + "$pk",
             syncLocation=False,
         )
+        if self.bulk_quick_save:
+            crud.quickSaveApi = self.prefix + "/patch"
+            crud.primaryField = "pk"
+        bulk_actions = self.get_bulk_actions(request, codenames)
+        if bulk_actions:
+            crud.bulkActions = bulk_actions
+            crud.primaryField = "pk"
+        if self.keyset_pagination:  # 返回hasNext的时候amis会使用简单分页
+            crud.api = self.prefix + "/list?cursor=${cursor}"
         if len(self.get_filters(request)) > 0 and self.prefix + "_list" in codenames:
             crud.filter = self.get_filter_page(request)
         body.append(crud)
@@ -239,48 +434,229 @@ class ModelAdmin(ModelSession, PageRouter):  # todo inline字段必须都在upda
         return Page(title=self.name, body=self.get_crud(request, codenames))
 
     async def update(self, request: Request, pk: str, data: Dict[str, Any]) -> Model:
-        obj = await self.get_instance(request, pk)
+        # 只处理提交了的字段，多对多字段直接比较中间表的主键，不需要预加载关联对象
+        update_fields = {k: v for k, v in self.get_update_fields().items() if k in data}
+        obj = await self.get_instance(
+            request, pk, {k: v for k, v in update_fields.items() if not v._many}
+        )
+        snapshot = self.get_snapshot(obj)
+        # 多对多字段在set_value中就会写入中间表，校验失败的时候需要一起回滚
+        async with transactions.in_transaction(self.model._meta.default_connection):
+            err_fields = await self.set_values(request, obj, update_fields, data)
+            err_fields.update(await self.check_foreign_keys(update_fields, obj, err_fields))
+            if err_fields:
+                raise FieldsError(err_fields)
+            await self.save_changed(obj, snapshot)
+        return obj
+
+    def get_snapshot(self, obj: Model) -> Dict[str, Any]:
+        """
+        读取对象所有数据库列的值，保存的时候用来比较哪些字段被修改了
+        """
+        return {name: getattr(obj, name) for name in self.model._meta.fields_db_projection}
+
+    async def save_changed(self, obj: Model, snapshot: Dict[str, Any]) -> List[str]:
+        """
+        只写入和snapshot相比被修改的字段，有修改的时候同时写入auto_now的字段，没有修改则不写入
+        返回写入的字段
+        """
+        changed = [name for name, value in snapshot.items() if getattr(obj, name) != value]
+        if changed:
+            changed.extend(name for name in self.get_auto_now_fields() if name not in changed)
+            await obj.save(update_fields=changed)
+        return changed
+
+    async def check_foreign_keys(
+        self, fields: Dict[str, BaseControl], obj: Model, err_fields: Dict[str, str]
+    ) -> Dict[str, str]:
+        """
+        校验外键指向的对象是否存在，指向同一个表的外键合并成一次查询，返回{字段名: 错误信息}
+        已经校验失败的字段不再查询
+        """
+        groups: Dict[Tuple[Type[Model], str], Dict[str, Any]] = {}
+        for field_name, field in fields.items():
+            if not isinstance(field, ForeignKeyControl) or field_name in err_fields:
+                continue
+            value = field.assigned_value(obj)
+            if value is not None:
+                key = (field.field.related_model, field.field.to_field)
+                groups.setdefault(key, {})[field_name] = value
+        ret = {}
+        for (related_model, to_field), values in groups.items():
+            exists = set(
+                await related_model.filter(
+                    **{to_field + "__in": list(set(values.values()))}
+                ).values_list(to_field, flat=True)
+            )
+            for field_name, value in values.items():
+                if value not in exists:
+                    ret[field_name] = f"{fields[field_name].label} 不存在 {value}"
+        return ret
+
+    async def get_update(self, request: Request, pk: str) -> dict:
+        # 多对多字段不预加载，由字段自己从中间表读取主键
+        fields = {k: v for k, v in self.get_update_fields().items() if not v._many}
+        obj = await self.get_instance(request, pk, fields)
+        return await self._update_serializer(request, obj)
+
+    async def patch(self, request: Request, pk: str, data: Dict[str, Any]) -> Optional[Model]:
+        inline_fields = self.get_inline_fields(data)
+        if self.is_plain_patch(inline_fields):
+            await self.fast_patch(request, pk, inline_fields, data)
+            return None
+        obj = await self.get_instance(request, pk, inline_fields)
+        snapshot = self.get_snapshot(obj)
+        err_fields = await self.set_values(request, obj, inline_fields, data)
+        if err_fields:
+            raise FieldsError(err_fields)
+        await self.save_changed(obj, snapshot)
+        return obj
+
+    async def patch_many(self, request: Request, rows: List[Dict[str, Any]]):
+        """
+        批量保存内联修改的数据，rows为amis的rowsDiff，每一行包含主键pk和修改了的字段
+        所有行都校验通过之后在一个事务里面保存，错误信息的键为"主键.字段名"
+        """
+        err_fields: Dict[str, str] = {}
+        plain_rows: List[Tuple[Any, Dict[str, Any]]] = []
+        objs: List[Tuple[Model, Dict[str, Any]]] = []
+        for row in rows:
+            pk = row.get("pk")
+            inline_fields = self.get_inline_fields(row)
+            if self.is_plain_patch(inline_fields):
+                values, errors = self.validate_values(
+                    inline_fields, row, is_create=request.method == "POST"
+                )
+                plain_rows.append((pk, values))
+            else:
+                obj = await self.get_instance(request, pk, inline_fields)
+                snapshot = self.get_snapshot(obj)
+                errors = await self.set_values(request, obj, inline_fields, row)
+                objs.append((obj, snapshot))
+            err_fields.update({f"{pk}.{k}": v for k, v in errors.items()})
+        if plain_rows:
+            pk_attr = self.model._meta.pk_attr
+            pks = [pk for pk, _ in plain_rows]
+            exists = set(await self.model.filter(pk__in=pks).values_list(pk_attr, flat=True))
+            field = self.model._meta.pk
+            for pk in pks:
+                if field.to_python_value(pk) not in exists:
+                    err_fields[f"{pk}.pk"] = "can not found instance:" + str(pk)
+        if err_fields:
+            raise FieldsError(err_fields)
+        async with transactions.in_transaction(self.model._meta.default_connection):
+            await self.bulk_patch(plain_rows)
+            for obj, snapshot in objs:
+                await self.save_changed(obj, snapshot)
+
+    async def bulk_patch(self, rows: List[Tuple[Any, Dict[str, Any]]]):
+        """
+        按照修改的字段分组，每组执行一次bulk_update，auto_now的字段同时更新
+        """
+        meta = self.model._meta
+        executor = meta.db.executor_class(model=self.model, db=meta.db)
+        auto_now = self.get_auto_now_fields()
+        now = timezone.now()
+        groups: Dict[Tuple[str, ...], List[Model]] = {}
+        for pk, values in rows:
+            if not values:
+                continue
+            values.update({name: now for name in auto_now})
+            # bulk_update不会转换字段的值，这里先转换成数据库的值
+            obj = self.model._init_from_db(**{meta.pk_attr: pk})
+            for name, value in values.items():
+                setattr(obj, name, executor.column_map[name](value, obj))
+            groups.setdefault(tuple(sorted(values)), []).append(obj)
+        for names, objs in groups.items():
+            await self.model.bulk_update(objs, names)
+
+    def get_inline_fields(self, data: Dict[str, Any]) -> Dict[str, BaseControl]:
+        """
+        data中提交了的内联字段
+        """
+        return {name: self.get_formitem_field(name) for name in self.inline if name in data}
+
+    async def set_values(
+        self, request: Request, obj: Model, fields: Dict[str, BaseControl], data: Dict[str, Any]
+    ) -> Dict[str, str]:
+        """
+        调用每个字段的set_value，返回{字段名: 错误信息}
+        """
         err_fields = {}
-        for field_name, field in self.get_update_fields().items():
+        for field_name, field in fields.items():
             try:
                 await field.set_value(request, obj, data[field_name])
             except ValidationError as e:
                 err_fields[field_name] = str(e)
             except TmpValueError as e:
                 err_fields[field_name] = str(e)
-        if err_fields:
-            raise FieldsError(err_fields)
-        await obj.save()
-        return obj
-
-    async def get_update(self, request: Request, pk: str) -> dict:
-        obj = await self.get_instance(request, pk)
-        ret = {}
-        for field_name, field in self.get_update_fields_with_pk().items():
-            ret[field_name] = await field.get_value(request, obj)
-        return ret
+        return err_fields
 
-    async def patch(self, request: Request, pk: str, data: Dict[str, Any]) -> Model:
-        obj = await self.get_instance(request, pk)
+    def validate_values(
+        self, fields: Dict[str, BaseControl], data: Dict[str, Any], is_create: bool = False
+    ) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """
+        在内存中校验和转换数据，返回({列名: 值}, {字段名: 错误信息})
+        is_create和set_value中传给validate的值保持一致
+        """
+        values = {}
         err_fields = {}
-        for field_name in self.inline:
-            control = self.get_formitem_field(field_name)
+        for field_name, field in fields.items():
             try:
-                await control.set_value(request, obj, data[field_name])
+                values[field.name] = field.validate(data[field_name], is_create=is_create)
             except ValidationError as e:
                 err_fields[field_name] = str(e)
             except TmpValueError as e:
                 err_fields[field_name] = str(e)
+        return values, err_fields
+
+    def get_auto_now_fields(self) -> List[str]:
+        return [
+            name
+            for name, field in self.model._meta.fields_map.items()
+            if getattr(field, "auto_now", False)
+        ]
+
+    def is_plain_patch(self, fields: Dict[str, BaseControl]) -> bool:
+        """
+        字段都直接写入对应的列，并且模型没有注册保存的信号时，不需要读取对象，可以直接生成update语句
+        """
+        listeners = self.model._listeners
+        if any(
+            listeners[signal].get(self.model) for signal in (Signals.pre_save, Signals.post_save)
+        ):
+            return False
+        db_fields = self.model._meta.fields_db_projection
+        return all(
+            _get_owner(type(field), "set_value") is BaseControl and field.name in db_fields
+            for field in fields.values()
+        )
+
+    async def fast_patch(
+        self, request: Request, pk: str, fields: Dict[str, BaseControl], data: Dict[str, Any]
+    ):
+        """
+        在内存中校验和转换数据之后执行一条update语句，auto_now的字段同时更新
+        """
+        values, err_fields = self.validate_values(fields, data, is_create=request.method == "POST")
         if err_fields:
             raise FieldsError(err_fields)
-        await obj.save()
-        return obj
+        queryset = self.model.filter(pk=pk)
+        if values:
+            now = timezone.now()
+            values.update({name: now for name in self.get_auto_now_fields()})
+            # mysql的影响行数不包括值没有变化的行，为0的时候再确认一次对象是否存在
+            if await queryset.update(**values):
+                return
+        if not await queryset.exists():
+            raise NotFoundError("can not found instance:" + str(pk))
 
     async def create(self, request: Request, data: Dict[str, Any]) -> Model:
         obj = self.model()
         cors = []
         field_errors = {}
-        for field_name, field in self.get_create_fields().items():
+        create_fields = self.get_create_fields()
+        for field_name, field in create_fields.items():
             try:
                 cor = await field.set_value(request, obj, data.get(field_name))  # 只有create可能有返回协程
                 if cor:
@@ -289,6 +665,7 @@ class ModelAdmin(ModelSession, PageRouter):  # todo inline字段必须都在upda
                 field_errors[field_name] = str(e)
             except TmpValueError as e:
                 field_errors[field_name] = str(e)
+        field_errors.update(await self.check_foreign_keys(create_fields, obj, field_errors))
         if field_errors:
             raise FieldsError(field_errors)
 
@@ -299,31 +676,157 @@ class ModelAdmin(ModelSession, PageRouter):  # todo inline字段必须都在upda
                 await cor
 
         await save_all()
+        clear_total(self.model)
         return obj
 
     async def delete(self, request: Request, pk: str):
         await self.model.filter(pk=pk).delete()
+        clear_total(self.model)
 
-    def prefetch(
-        self, request: Request, queryset: QuerySet, fields: Dict[str, BaseControl]
-    ) -> QuerySet:
+    async def bulk_action(self, request: Request, action: str, data: Dict[str, Any]) -> int:
+        """
+        执行批量操作，返回影响的行数
+        查询参数ids为逗号分隔的主键，all为true的时候操作所有符合过滤条件的数据，不需要传入主键
+        """
+        if action == "delete" and "deleteMany" in self.methods:
+            return await self.bulk_delete(request)
+        if action == "update" and self.bulk_update_fields:
+            return await self.bulk_set(request, data)
+        raise NotFoundError("can not found bulk action:" + action)
+
+    async def iter_bulk_pks(self, request: Request) -> AsyncIterator[List[Any]]:
         """
-        判断是否需要额外预加载的数据
+        按照BULK_ACTION_CHUNK_SIZE分批返回批量操作的主键
+        全选的时候按照主键顺序分批查询，主键列表不需要经过浏览器
         """
-        select_list = []
-        prefeth_list = []
+        size = settings.BULK_ACTION_CHUNK_SIZE
+        if request.query_params.get("all") == "true":
+            pk_attr = self.model._meta.pk_attr
+            queryset = self.queryset_filter(request, self.queryset(request)).order_by(pk_attr)
+            last = None
+            while True:
+                chunk_queryset = queryset if last is None else queryset.filter(pk__gt=last)
+                pks = await chunk_queryset.limit(size).values_list(pk_attr, flat=True)
+                if pks:
+                    yield pks
+                if len(pks) < size:
+                    return
+                last = pks[-1]
+        else:
+            pks = [i for i in request.query_params.get("ids", "").split(",") if i]
+            for chunk_pks in chunk(pks, size):
+                yield chunk_pks
+
+    async def bulk_delete(self, request: Request) -> int:
+        """
+        每批数据执行一条delete语句，模型注册了删除的信号时逐个删除
+        """
+        listeners = self.model._listeners
+        per_object = any(
+            listeners[signal].get(self.model)
+            for signal in (Signals.pre_delete, Signals.post_delete)
+        )
+        count = 0
+        async for pks in self.iter_bulk_pks(request):
+            queryset = self.model.filter(pk__in=pks)
+            if per_object:
+                async with transactions.in_transaction(self.model._meta.default_connection):
+                    for obj in await queryset:
+                        await obj.delete()
+                        count += 1
+            else:
+                count += await queryset.delete()
+        clear_total(self.model)
+        return count
+
+    async def bulk_set(self, request: Request, data: Dict[str, Any]) -> int:
+        """
+        把bulk_update_fields中提交了的字段批量修改为相同的值，每批数据执行一条update语句
+        自定义的字段或者模型注册了保存的信号时逐个保存
+        """
+        fields = {
+            name: self.get_formitem_field(name) for name in self.bulk_update_fields if name in data
+        }
+        if not fields:
+            return 0
+        count = 0
+        if self.is_plain_patch(fields):
+            values, err_fields = self.validate_values(
+                fields, data, is_create=request.method == "POST"
+            )
+            if err_fields:
+                raise FieldsError(err_fields)
+            now = timezone.now()
+            values.update({name: now for name in self.get_auto_now_fields()})
+            async for pks in self.iter_bulk_pks(request):
+                count += await self.model.filter(pk__in=pks).update(**values)
+            return count
+        async for pks in self.iter_bulk_pks(request):
+            async with transactions.in_transaction(self.model._meta.default_connection):
+                for obj in await self.prefetch(request, self.model.filter(pk__in=pks), fields):
+                    snapshot = self.get_snapshot(obj)
+                    err_fields = await self.set_values(request, obj, fields, data)
+                    if err_fields:
+                        raise FieldsError(err_fields)
+                    await self.save_changed(obj, snapshot)
+                    count += 1
+        return count
+
+    def get_prefetch_plan(
+        self, request: Request, fields: Dict[str, BaseControl]
+    ) -> Tuple[List[str], List[Union[str, Prefetch]], int]:
+        """
+        预加载计划，返回(select_related的字段, prefetch_related的字段, prefetch产生的查询数)
+        字段名可以是a__b形式的嵌套路径，嵌套的prefetch每一层产生一次查询
+        """
+        select_list: List[str] = []
+        prefetch_list: List[Union[str, Prefetch]] = []
+        queries = 0
         for field_name, field in fields.items():
             d = field.prefetch()
             if d == "select":
                 select_list.append(field_name)
             elif d == "prefetch":
-                prefeth_list.append(field_name)
+                queryset = field.prefetch_queryset()
+                if queryset is not None and "__" not in field_name:
+                    prefetch_list.append(Prefetch(field_name, queryset=queryset))
+                else:
+                    prefetch_list.append(field_name)
+                queries += field_name.count("__") + 1
+        return select_list, prefetch_list, queries
+
+    def prefetch(
+        self, request: Request, queryset: QuerySet, fields: Dict[str, BaseControl]
+    ) -> QuerySet:
+        """
+        判断是否需要额外预加载的数据，外键和多对多可以同时预加载
+        """
+        select_list, prefetch_list, _ = self.get_prefetch_plan(request, fields)
         if len(select_list) > 0:
             queryset = queryset.select_related(*select_list)
-        elif len(prefeth_list) > 0:
-            queryset = queryset.prefetch_related(*prefeth_list)
+        if len(prefetch_list) > 0:
+            queryset = queryset.prefetch_related(*prefetch_list)
         return queryset
 
+    def get_list_prefetch_fields(self) -> Dict[str, BaseControl]:
+        """
+        列表页需要预加载的字段，多对多字段不在列表页读取
+        """
+        return {k: v for k, v in self.get_list_distplay().items() if not v._many}
+
+    def get_list_query_plan(self, request: Request) -> int:
+        """
+        列表页预计执行的查询数量：数据、总数（估算的时候可能有两次）、多对多的计数以及预加载
+        """
+        planned = 3 + len(self.get_list_many_fields())
+        if self.list_projection:
+            for field in self.get_list_prefetch_fields().values():
+                if isinstance(field, ForeignKeyControl) and not field.label_field:
+                    planned += 1
+        else:
+            planned += self.get_prefetch_plan(request, self.get_list_prefetch_fields())[2]
+        return planned
+
     def queryset(self, request: Request):
         ret = self.model.all()
         return ret
@@ -335,27 +838,174 @@ class ModelAdmin(ModelSession, PageRouter):  # todo inline字段必须都在upda
         page: int = 1,
         orderBy: Optional[str] = None,
         orderDir: Optional[str] = None,
+    ) -> Union[ListDataWithPage, ListDataWithCursor]:
+        """
+        开启LIST_QUERY_CHECK的时候检查查询数量，超出预加载计划说明有字段在逐行查询数据库
+        """
+        with QueryCounter(enabled=settings.LIST_QUERY_CHECK) as counter:
+            if self.keyset_pagination:
+                ret = await self.keyset_list(request, perPage, page, orderBy, orderDir)
+            else:
+                ret = await self.offset_list(request, perPage, page, orderBy, orderDir)
+        if counter.enabled:
+            planned = self.get_list_query_plan(request)
+            if counter.count > planned:
+                raise AssertionError(
+                    f"{self.prefix} list executed {counter.count} queries, planned {planned}"
+                )
+        return ret
+
+    async def offset_list(
+        self,
+        request: Request,
+        perPage: int = 10,
+        page: int = 1,
+        orderBy: Optional[str] = None,
+        orderDir: Optional[str] = None,
     ) -> ListDataWithPage:
         base_queryset = self.queryset(request)
         base_queryset = self.queryset_filter(request, base_queryset)
-        queryset = self.prefetch(request, base_queryset, self.get_list_distplay())
+        if self.list_projection:
+            queryset = base_queryset
+        else:
+            queryset = self.prefetch(request, base_queryset, self.get_list_prefetch_fields())
         if orderBy and orderBy in self.ordering:
             queryset = queryset.order_by("-" + orderBy if orderDir == "desc" else orderBy)
-        datas = await queryset.limit(perPage).offset((page - 1) * perPage)
-        res = []
-        for i in datas:
-            ret = {}
-            for field_name, field in self.get_list_display_with_pk().items():
-                if field._many:
-                    continue
-                ret[field_name] = await field.get_value(request, i)
-            res.append(ret)
-        count = await base_queryset.count()
-        return ListDataWithPage(total=count, items=res)
+        if self.list_projection:
+            rows, total, approximate = await paginate(
+                queryset, base_queryset, perPage, page, self.get_projection(request)
+            )
+            res = await self.get_list_rows(request, rows)
+        else:
+            datas, total, approximate = await paginate(queryset, base_queryset, perPage, page)
+            res = await self.get_list_items(request, datas)
+        return list_data(res, total, approximate)
+
+    def get_projection(self, request: Request) -> Dict[str, str]:
+        """
+        列表页投影查询的列，只读取list_display需要的列
+        """
+        values = {}
+        for field in self.get_list_display_with_pk().values():
+            if not field._many:
+                values.update((path, path) for path in field.values_fields())
+        values["pk"] = self.model._meta.pk_attr
+        return values
+
+    async def get_list_rows(self, request: Request, rows: List[dict]) -> List[dict]:
+        """
+        把投影查询的结果转换为列表页的数据，每个字段批量转换
+        """
+        res: List[dict] = [{} for _ in rows]
+        for field_name, field in self.get_list_display_with_pk().items():
+            if field._many:
+                continue
+            for ret, value in zip(res, await field.get_values(request, rows)):
+                ret[field_name] = value
+        await self.set_many_counts(request, [row["pk"] for row in rows], res)
+        return res
+
+    async def get_list_items(self, request: Request, datas: Iterable[Model]) -> List[dict]:
+        """
+        把查询到的数据转换为列表页的数据
+        """
+        datas = list(datas)
+        res = await self._list_serializer.serialize(request, datas)
+        await self.set_many_counts(request, [i.pk for i in datas], res)
+        return res
+
+    def get_list_many_fields(self) -> Dict[str, ManyToManyControl]:
+        """
+        列表页的多对多和反向外键字段，只展示关联对象的数量
+        """
+        return {
+            k: v for k, v in self.get_list_distplay().items() if isinstance(v, ManyToManyControl)
+        }
+
+    async def set_many_counts(self, request: Request, pks: List[Any], res: List[dict]):
+        """
+        每个多对多字段对当前页执行一次分组计数，关联对象在打开弹窗的时候才查询
+        """
+        if not pks:
+            return
+        for field_name, field in self.get_list_many_fields().items():
+            counts = await field.get_counts(request, self.model.filter(pk__in=pks))
+            for pk, ret in zip(pks, res):
+                ret[field_name] = counts.get(pk, 0)
+
+    def get_keyset_ordering(
+        self, orderBy: Optional[str] = None, orderDir: Optional[str] = None
+    ) -> List[Tuple[str, bool]]:
+        """
+        游标分页的排序字段，返回(字段名, 是否倒序)
+        优先使用页面上选择的排序，其次是model的默认排序，最后加上主键保证顺序唯一
+        """
+        meta = self.model._meta
+        if orderBy and orderBy in self.ordering:
+            keys = [(orderBy, orderDir == "desc")]
+        else:
+            keys = [(name, order.value == "DESC") for name, order in meta._default_ordering]
+        keys = [
+            (getattr(meta.fields_map[name], "source_field", None) or name, desc)
+            for name, desc in keys
+        ]
+        if meta.pk_attr not in [name for name, desc in keys]:
+            keys.append((meta.pk_attr, keys[-1][1] if keys else False))
+        return keys
+
+    def keyset_filter(self, keys: List[Tuple[str, bool]], values: List[Any]) -> Q:
+        """
+        (k1 > v1) or (k1 = v1 and k2 > v2) or ...
+        """
+        fields_map = self.model._meta.fields_map
+        values = [fields_map[name].to_python_value(v) for (name, _), v in zip(keys, values)]
+        conditions = []
+        for i, (name, desc) in enumerate(keys):
+            condition = {k: v for (k, _), v in zip(keys[:i], values[:i])}
+            condition[f"{name}__{'lt' if desc else 'gt'}"] = values[i]
+            conditions.append(Q(**condition))
+        return Q(*conditions, join_type="OR")
 
-    async def get_instance(self, request: Request, pk: Any) -> Model:
+    async def keyset_list(
+        self,
+        request: Request,
+        perPage: int = 10,
+        page: int = 1,
+        orderBy: Optional[str] = None,
+        orderDir: Optional[str] = None,
+    ) -> ListDataWithCursor:
+        """
+        游标分页，游标由上一页生成，跳页或者向前翻页的时候退回到offset查询
+        """
+        queryset = self.queryset_filter(request, self.queryset(request))
+        queryset = self.prefetch(request, queryset, self.get_list_prefetch_fields())
+        keys = self.get_keyset_ordering(orderBy, orderDir)
+        queryset = queryset.order_by(*[("-" if desc else "") + name for name, desc in keys])
+        cursor = request.query_params.get("cursor")
+        cursor_page, values = decode_cursor(cursor) if cursor and page > 1 else (0, [])
+        if page > 1 and cursor_page == page - 1 and len(values) == len(keys):
+            queryset = queryset.filter(self.keyset_filter(keys, values))
+        else:
+            queryset = queryset.offset((page - 1) * perPage)
+        datas = await queryset.limit(perPage + 1)
+        has_next = len(datas) > perPage
+        datas = datas[:perPage]
+        next_cursor = ""
+        if datas:
+            next_cursor = encode_cursor(page, [getattr(datas[-1], name) for name, _ in keys])
+        items = await self.get_list_items(request, datas)
+        return ListDataWithCursor(items=items, hasNext=has_next, cursor=next_cursor)
+
+    async def get_instance(
+        self, request: Request, pk: Any, fields: Optional[Dict[str, BaseControl]] = None
+    ) -> Model:
+        """
+        fields为需要预加载的字段，默认为更新页面的字段
+        """
         queryset = self.model.filter(pk=pk)
-        queryset = self.prefetch(request, queryset, self.get_update_fields())
+        if fields is None:
+            fields = self.get_update_fields()
+        queryset = self.prefetch(request, queryset, fields)
         instance = await queryset.first()
 
         if instance is None:
@@ -380,10 +1030,8 @@ class ModelAdmin(ModelSession, PageRouter):  # todo inline字段必须都在upda
         user = request.user
         if user.is_superuser:
             return self._permissions
-        return [
-            i.codename
-            for i in await Permission.filter(groups__users=user, codename__in=self._permissions)
-        ]
+        codenames = await get_codenames(request)
+        return [i for i in self._permissions if i in codenames]
 
     def make_fields(self):
         if not self.fields.get("pk"):
@@ -401,6 +1049,18 @@ class ModelAdmin(ModelSession, PageRouter):  # todo inline字段必须都在upda
                     logger.error(f"can not found field {field} in {self.model.__name__}")
                     continue
                 self.fields[field] = create_column(field, field_type, self.prefix)
+        for name, label_field in self.label_fields.items():
+            field_ = self.fields.get(name)
+            if isinstance(field_, (ForeignKeyControl, ManyToManyControl)):
+                field_.label_field = label_field
+            else:
+                logger.error(f"label field {name} is not a relation in {self.model.__name__}")
+        for name, search_fields in self.select_search_fields.items():
+            field_ = self.fields.get(name)
+            if isinstance(field_, (ForeignKeyControl, ManyToManyControl)):
+                field_.search_fields = search_fields
+            else:
+                logger.error(f"search field {name} is not a relation in {self.model.__name__}")
 
     def get_formitem_field(self, name: str) -> BaseControl:
         ret = self.fields.get(name)
@@ -433,6 +1093,8 @@ class ModelAdmin(ModelSession, PageRouter):  # todo inline字段必须都在upda
             if i not in col_set:
                 logger.warning("inline field " + i + " not in list_display")
 
+        self._list_serializer = RowSerializer(self.get_list_display_with_pk(), skip_many=True)
+        self._update_serializer = RowSerializer(self.get_update_fields_with_pk())
         # 同步select或其他接口
         self._select_defs = {}
         for field_name, field in self.fields.items():
@@ -446,17 +1108,19 @@ class ModelAdmin(ModelSession, PageRouter):  # todo inline字段必须都在upda
         pk: Optional[str],
         perPage: Optional[int],
         page: Optional[int],
+        filter: Any = None,
     ) -> List[Dict[str, str]]:
         """
         外键的枚举获取值以及多对多获取对象列表
+        filter: 搜索的关键字
         """
-        return await self._select_defs[name](
-            request, pk, perPage, page, None
-        )  # todo: 增加select的搜索功能
+        return await self._select_defs[name](request, pk, perPage, page, filter)
 
     async def check_perm(self, request: Request, codename: str):
         user = request.user
-        if not await user.has_perm(codename.lower()):
+        if user.is_superuser and user.is_active:
+            return
+        if codename.lower() not in await get_codenames(request):
             raise PermError()
 
 
@@ -1,7 +1,8 @@
 import logging
 import re
 from abc import abstractmethod
-from typing import Any, Coroutine, Dict, Iterable, List, Optional, Tuple, Union
+from operator import attrgetter
+from typing import Any, Callable, Coroutine, Dict, Iterable, List, Optional, Tuple, Union
 
 from starlette.requests import Request
 from starlette.responses import Response
@@ -13,7 +14,7 @@ from fast_tmp.amis.formitem import FormItem, FormItemEnum
 from fast_tmp.amis.page import Page
 from fast_tmp.amis.response import AmisStructError
 from fast_tmp.exceptions import NotFoundError
-from fast_tmp.responses import AdminRes, ListDataWithPage
+from fast_tmp.responses import AdminRes, ListDataWithCursor, ListDataWithPage
 
 logger = logging.getLogger(__file__)
 
@@ -40,12 +41,30 @@ class AbstractAmisAdminDB:
         """
         return None
 
+    def prefetch_queryset(self) -> Optional[QuerySet]:
+        """
+        prefetch为prefetch的时候预加载使用的查询，为空则读取关联表的所有字段
+        """
+        return None
+
     async def get_value(self, request: Request, obj: Model) -> Any:
         """
         获取值
         """
         return getattr(obj, self.name)
 
+    def values_fields(self) -> Tuple[str, ...]:
+        """
+        列表页投影查询时需要读取的列
+        """
+        return (self.name,)
+
+    async def get_values(self, request: Request, rows: List[dict]) -> List[Any]:
+        """
+        从投影查询的结果中批量获取值
+        """
+        return [row[self.name] for row in rows]
+
     async def set_value(self, request: Request, obj: Model, value: Any) -> Optional[Coroutine]:
         """
         设置值
@@ -180,6 +199,28 @@ class BaseControl(AbstractAmisAdminDB, AbstractControl, AmisOrm):
     async def get_value(self, request: Request, obj: Model) -> Any:
         return self.orm_2_amis(getattr(obj, self.name))
 
+    async def get_values(self, request: Request, rows: List[dict]) -> List[Any]:
+        return [self.orm_2_amis(row[self.name]) for row in rows]
+
+    def make_converter(self) -> Callable[[Any], Any]:
+        """
+        生成orm_2_amis的等价函数，子类可以在这里预先计算好转换需要的数据
+        """
+        return self.orm_2_amis
+
+    def get_converter(self) -> Optional[Callable[[Any], Any]]:
+        """
+        序列化时使用的转换函数，值不需要转换则返回None
+        子类重写了orm_2_amis但是没有重写make_converter的时候，使用orm_2_amis
+        """
+        cls = type(self)
+        orm_2_amis_owner = _get_owner(cls, "orm_2_amis")
+        if orm_2_amis_owner is AmisOrm:
+            return None
+        if issubclass(_get_owner(cls, "make_converter"), orm_2_amis_owner):
+            return self.make_converter()
+        return self.orm_2_amis
+
     def __init__(
         self,
         label: str,
@@ -199,6 +240,63 @@ class BaseControl(AbstractAmisAdminDB, AbstractControl, AmisOrm):
         self.placeholder = placeholder
 
 
+def _get_owner(cls: type, name: str) -> type:
+    """
+    获取定义该方法的类
+    """
+    for klass in cls.__mro__:
+        if name in klass.__dict__:
+            return klass
+    raise AttributeError(name)
+
+
+class RowSerializer:
+    """
+    把model对象转换为页面数据，ModelAdmin初始化的时候根据字段编译
+    普通字段直接读取属性，需要转换的字段使用预先生成的转换函数，只有重写了get_value的字段走异步调用
+    skip_many: 跳过多对多字段，列表页不读取多对多字段
+    """
+
+    def __init__(self, fields: Dict[str, BaseControl], skip_many: bool = False):
+        self.getters: List[Tuple[str, Callable[[Any], Any], Optional[Callable[[Any], Any]]]] = []
+        self.async_fields: List[Tuple[str, BaseControl]] = []
+        names = []
+        for field_name, field in fields.items():
+            if skip_many and field._many:
+                continue
+            names.append(field_name)
+            if _get_owner(type(field), "get_value") is BaseControl:
+                self.getters.append((field_name, attrgetter(field.name), field.get_converter()))
+            else:
+                self.async_fields.append((field_name, field))
+        # 异步字段不在最后的时候需要恢复字段的顺序
+        self.names: Optional[Tuple[str, ...]] = None
+        start = len(self.getters)
+        if names[start:] != [name for name, _ in self.async_fields]:
+            self.names = tuple(names)
+
+    def to_dict(self, obj: Model) -> dict:
+        ret = {}
+        for field_name, getter, converter in self.getters:
+            value = getter(obj)
+            ret[field_name] = value if converter is None else converter(value)
+        return ret
+
+    async def __call__(self, request: Request, obj: Model) -> dict:
+        ret = self.to_dict(obj)
+        for field_name, field in self.async_fields:
+            ret[field_name] = await field.get_value(request, obj)
+        if self.names is not None:
+            ret = {name: ret[name] for name in self.names}
+        return ret
+
+    async def serialize(self, request: Request, objs: Iterable[Model]) -> List[dict]:
+        if not self.async_fields:
+            to_dict = self.to_dict
+            return [to_dict(obj) for obj in objs]
+        return [await self(request, obj) for obj in objs]
+
+
 class BaseAdminControl(BaseControl):
     """
     ModelAdmin使用的类型
@@ -385,15 +483,27 @@ class ModelSession:
         page: int = 1,
         orderBy: Optional[str] = None,
         orderDir: Optional[str] = None,
-    ) -> ListDataWithPage:
+    ) -> Union[ListDataWithPage, ListDataWithCursor]:
         """
         获取数据列表
         """
 
     @abstractmethod
-    async def patch(self, request: Request, pk: str, data: Dict[str, Any]) -> Model:
+    async def patch(self, request: Request, pk: str, data: Dict[str, Any]) -> Optional[Model]:
+        """
+        对在表单上快速编辑的（inline类型）数据的进行修改，没有读取对象的时候返回None
+        """
+
+    @abstractmethod
+    async def patch_many(self, request: Request, rows: List[Dict[str, Any]]):
+        """
+        批量保存快速编辑的数据
+        """
+
+    @abstractmethod
+    async def bulk_action(self, request: Request, action: str, data: Dict[str, Any]) -> int:
         """
-        对在表单上快速编辑的（inline类型）数据的进行修改
+        批量操作，返回影响的行数
         """
 
     @abstractmethod
@@ -422,6 +532,7 @@ class ModelSession:
         pk: Optional[str],
         perPage: Optional[int],
         page: Optional[int],
+        filter: Any = None,
     ) -> List[Dict[str, str]]:
         """
         多对多，多对一等情况下需要枚举选择的时候，返回数据列表
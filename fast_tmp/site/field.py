@@ -1,9 +1,11 @@
+import asyncio
 import datetime
 import json
 from abc import abstractmethod
 from decimal import Decimal
-from typing import Any, Coroutine, Iterable, List, Optional, Tuple
+from typing import Any, Callable, Coroutine, Dict, Iterable, List, Optional, Tuple
 
+from pypika import Table
 from starlette.requests import Request
 from tortoise import (
     BackwardFKRelation,
@@ -14,7 +16,13 @@ from tortoise import (
     OneToOneFieldInstance,
     fields,
 )
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.expressions import Q, Subquery
 from tortoise.fields.data import CharEnumFieldInstance, IntEnumFieldInstance
+from tortoise.functions import Count
+from tortoise.queryset import QuerySet
+from tortoise.transactions import in_transaction
+from tortoise.utils import chunk
 
 from fast_tmp.amis.actions import DialogAction
 from fast_tmp.amis.column import Column, Operation
@@ -33,9 +41,11 @@ from fast_tmp.amis.formitem import (
     TimeItem,
     TransferItem,
 )
+from fast_tmp.amis.forms import FilterModel
 from fast_tmp.amis.frame import Dialog
 from fast_tmp.amis.response import AmisStructError
-from fast_tmp.contrib.auth.hashers import make_password
+from fast_tmp.contrib.auth.hashers import amake_password
+from fast_tmp.conf import settings
 from fast_tmp.contrib.tortoise.fields import FileField, ImageField, RichTextField
 from fast_tmp.exceptions import TmpValueError
 from fast_tmp.responses import ListDataWithPage
@@ -92,6 +102,9 @@ class DecimalControl(BaseAdminControl):
         if value is not None:
             return float(value)
 
+    def make_converter(self) -> Callable[[Any], Any]:
+        return lambda value: None if value is None else float(value)
+
 
 class IntEnumControl(BaseAdminControl):
     _control_type = FormItemEnum.select
@@ -111,6 +124,17 @@ class IntEnumControl(BaseAdminControl):
         if value is not None:
             return value.name
 
+    def make_converter(self) -> Callable[[Any], Any]:
+        names = {i: i.name for i in self._field.enum_type}
+
+        def converter(value: Any) -> Any:
+            if value is None:
+                return None
+            name = names.get(value)
+            return value.name if name is None else name
+
+        return converter
+
     def amis_2_orm(self, value: Any) -> Any:
         if value is None and self._field.null:
             return None
@@ -148,6 +172,9 @@ class BooleanControl(IntEnumControl):
             return "True"
         return "False"
 
+    def make_converter(self) -> Callable[[Any], Any]:
+        return lambda value: None if value is None else ("True" if value else "False")
+
 
 class StrEnumControl(IntEnumControl):
     pass
@@ -179,6 +206,16 @@ class DateTimeControl(BaseAdminControl):
         if value is not None:
             return value.strftime("%Y-%m-%d %H:%M:%S")
 
+    def make_converter(self) -> Callable[[Any], Any]:
+        def converter(value: Optional[datetime.datetime]) -> Any:
+            if value is None:
+                return None
+            if value.year >= 1000:  # isoformat比strftime快很多，截掉秒之后的时区
+                return value.isoformat(" ", "seconds")[:19]
+            return value.strftime("%Y-%m-%d %H:%M:%S")
+
+        return converter
+
 
 class DateControl(BaseAdminControl):
     _control_type = FormItemEnum.input_date
@@ -208,6 +245,16 @@ class DateControl(BaseAdminControl):
             return None
         return value.strftime("%Y-%m-%d")
 
+    def make_converter(self) -> Callable[[Any], Any]:
+        def converter(value: Optional[datetime.date]) -> Any:
+            if value is None:
+                return None
+            if value.year >= 1000:  # isoformat比strftime快很多，年份不足四位的时候两者不一致
+                return value.isoformat()
+            return value.strftime("%Y-%m-%d")
+
+        return converter
+
 
 class TimeControl(BaseAdminControl):
     _control_type = FormItemEnum.input_time
@@ -237,6 +284,9 @@ class TimeControl(BaseAdminControl):
         if value is not None:
             return value.strftime("%H:%M:%S")
 
+    def make_converter(self) -> Callable[[Any], Any]:
+        return lambda value: None if value is None else value.isoformat("seconds")[:8]
+
 
 class JsonControl(TextControl):
     def amis_2_orm(self, value: Any) -> Any:
@@ -264,11 +314,96 @@ class JsonControl(TextControl):
         return self._column_inline
 
 
+def search_queryset(queryset: QuerySet, term: Any, search_fields: Iterable[str] = ()) -> QuerySet:
+    """
+    按照关键字搜索关联表，只搜索声明过的搜索字段；没有声明的时候只按主键匹配，
+    不会去扫描所有的字符串字段（避免搜到密码之类的敏感字段，也避免全表模糊查询）
+    """
+    if not term:
+        return queryset
+    if isinstance(term, dict):
+        return queryset.filter(**term)
+    names = list(search_fields)
+    if not names:
+        try:
+            pk = queryset.model._meta.pk.to_python_value(term)
+        except (TypeError, ValueError):
+            pk = None  # 不能转换为主键的关键字不匹配任何数据
+        return queryset.filter(pk=pk)
+    return queryset.filter(
+        Q(*[Q(**{name + "__icontains": term}) for name in names], join_type="OR")
+    )
+
+
+def page_queryset(queryset: QuerySet, perPage: Optional[int], page: Optional[int]) -> QuerySet:
+    """
+    分页查询，perPage为空或0的时候不分页，没有默认排序的时候按照主键排序保证分页的顺序
+    """
+    if not perPage:
+        return queryset
+    meta = queryset.model._meta
+    if not meta._default_ordering:
+        queryset = queryset.order_by(meta.pk_attr)
+    return queryset.limit(perPage).offset((max(page or 1, 1) - 1) * perPage)
+
+
 class RelationSelectApi:
     """
     增加一个查询foreign外键所有字段的接口
     """
 
+    label_field: Optional[str] = None  # 作为标签的关联表字段
+    search_fields: Tuple[str, ...] = ()  # 按关键字搜索的关联表字段，为空则使用label_field
+
+    def get_label(self, obj: Model) -> str:
+        return str(getattr(obj, self.label_field) if self.label_field else obj)
+
+    def get_search_fields(self) -> Tuple[str, ...]:
+        if self.search_fields:
+            return self.search_fields
+        return (self.label_field,) if self.label_field else ()
+
+    async def get_options(
+        self,
+        request: Request,
+        queryset: QuerySet,
+        perPage: Optional[int],
+        page: Optional[int],
+        filter: Any = None,
+    ) -> dict:
+        """
+        表单中可以选择的选项，filter为搜索的关键字，每次最多返回perPage个，未传入时使用SELECT_PAGE_SIZE
+        查询参数value为表单当前选中的值，多个值用逗号分隔，不在这一页选项中的选中对象会一起返回，用于显示标签
+        """
+        data = list(await self.option_queryset(queryset, perPage, page, filter))
+        value = request.query_params.get("value")
+        if value:
+            loaded = {i.pk for i in data}
+            missing = []
+            pk_field = queryset.model._meta.pk
+            for i in value.split(","):
+                try:
+                    pk = pk_field.to_python_value(i)
+                except (TypeError, ValueError):  # 没有选中值的时候前端可能传入空对象
+                    continue
+                if pk is not None and pk not in loaded:
+                    missing.append(pk)
+            if missing:
+                data.extend(await queryset.model.filter(pk__in=missing))
+        return {"options": self.to_options(data)}
+
+    def option_queryset(
+        self, queryset: QuerySet, perPage: Optional[int], page: Optional[int], filter: Any = None
+    ) -> QuerySet:
+        """
+        一页可以选择的选项，filter为搜索的关键字
+        """
+        queryset = search_queryset(queryset, filter, self.get_search_fields())
+        return page_queryset(queryset, perPage or settings.SELECT_PAGE_SIZE, page)
+
+    def to_options(self, data: Iterable[Model]) -> List[dict]:
+        return [{"value": i.pk, "label": self.get_label(i)} for i in data]
+
     @abstractmethod
     async def get_selects(
         self,
@@ -287,11 +422,18 @@ class ForeignKeyControl(BaseAdminControl, RelationSelectApi):
     _control_type = FormItemEnum.select
     need_perms: Optional[Tuple[str, ...]] = None
     _control: SelectItem = None  # type: ignore
+    label_field: Optional[str] = None  # 作为标签的关联表字段，也用于列表页的投影查询
 
     def related_prefix(self) -> str:
         # todo: 增加到文档，创建按钮根据页面注册的类的prefix进行搜索。
         return self.field.related_model.__name__.lower()
 
+    async def select_queryset(self, request: Request) -> QuerySet:
+        """
+        可以选择的关联对象
+        """
+        return self._field.related_model.all()
+
     async def get_selects(
         self,
         request: Request,
@@ -300,23 +442,8 @@ class ForeignKeyControl(BaseAdminControl, RelationSelectApi):
         page: Optional[int],
         filter: Any = None,
     ):
-        field_model_all = self._field.related_model.all()
-        # if filter:
-        #     if isinstance(filter, dict):
-        #         field_model_all = self._field.related_model.filter(**filter)
-        #     else:
-        #         field_model_all = self._field.related_model.filter(filter)
-        # if perPage is not None and page is not None:
-        #     field_model = field_model_all.limit(perPage).offset((page - 1) * perPage)
-        #     count = await field_model_all.count()
-        #     data = await field_model
-        #     return ListDataWithPage(
-        #         total=count,
-        #         items=[{"value": i.pk, "label": str(i)} for i in data],
-        #     )
-        # else:
-        data = await field_model_all
-        return {"options": [{"value": i.pk, "label": str(i)} for i in data]}
+        queryset = await self.select_queryset(request)
+        return await self.get_options(request, queryset, perPage, page, filter)
 
     def prefetch(self) -> Optional[str]:
         return "select"
@@ -338,10 +465,12 @@ class ForeignKeyControl(BaseAdminControl, RelationSelectApi):
         from fast_tmp.site import resources
 
         if not self._control:
+            api = f"get:{self.prefix}/select/{self.name}?perPage={settings.SELECT_PAGE_SIZE}"
             self._control = SelectItem(
                 name=self.name,
                 label=self.label,
-                source=f"get:{self.prefix}/select/{self.name}",
+                source=api + self.selected_query(),
+                autoComplete=api + "&term=$term",
                 labelField="label",
                 valueField="value",
                 clearable=True,
@@ -364,17 +493,80 @@ class ForeignKeyControl(BaseAdminControl, RelationSelectApi):
                         break
         return self._control
 
+    def selected_query(self) -> str:
+        """
+        选项接口带上当前选中的值，编辑页的值是{label, value}，选择之后是value
+        """
+        return f"&value=${{{self.name}.value || {self.name}}}"
+
     def orm_2_amis(self, value: Any) -> Any:
         if not value:
             return {"label": "-", "value": None}
         return {"label": str(value), "value": value.pk}
 
+    def value_path(self) -> str:
+        """
+        投影查询时关联对象的值对应的列
+        """
+        return self.field.source_field
+
+    def related_key(self) -> str:
+        """
+        关联表中与value_path的值对应的字段
+        """
+        return self.field.to_field
+
+    def values_fields(self) -> Tuple[str, ...]:
+        if self.label_field:
+            return self.value_path(), f"{self.name}__{self.label_field}"
+        return (self.value_path(),)
+
+    async def get_values(self, request: Request, rows: List[dict]) -> List[Any]:
+        value_path = self.value_path()
+        if self.label_field:
+            label_path = f"{self.name}__{self.label_field}"
+            labels = {row[value_path]: row[label_path] for row in rows}
+        else:  # 没有声明标签字段的时候批量查询当前页的关联对象
+            values = {row[value_path] for row in rows if row[value_path] is not None}
+            labels = {}
+            if values:
+                related_key = self.related_key()
+                objs = await self.field.related_model.filter(**{related_key + "__in": values})
+                labels = {getattr(i, related_key): i for i in objs}
+        return [
+            {"label": "-", "value": None}
+            if row[value_path] is None
+            else {"label": str(labels.get(row[value_path], "-")), "value": row[value_path]}
+            for row in rows
+        ]
+
     async def set_value(self, request: Request, obj: Model, value: Any):
-        if value is not None:
-            if isinstance(value, dict):
-                value = value.get("value")
-            value = await self._field.related_model.filter(pk=value).first()
-        setattr(obj, self.name, value)
+        """
+        直接写入外键的列，不查询关联对象，关联对象是否存在由ModelAdmin.check_foreign_keys批量校验
+        """
+        if isinstance(value, dict):
+            value = value.get("value")
+        if value is None or value == "":
+            if not self._field.null:
+                raise TmpValueError(f"{self.label} 不能为空")
+            value = None
+        else:
+            try:
+                value = self._field.to_field_instance.to_python_value(value)
+            except (TypeError, ValueError):
+                raise TmpValueError(f"{self.label} 不能为 {value}")
+        if getattr(obj, self._field.source_field) != value:
+            setattr(obj, self._field.source_field, value)
+            obj.__dict__.pop("_" + self.name, None)  # 去掉已经加载的关联对象
+
+    def assigned_value(self, obj: Model) -> Any:
+        """
+        set_value写入的外键列的值，用于校验关联对象是否存在
+        关联对象已经加载并且没有修改的时候返回None，不需要再校验
+        """
+        if "_" + self.name in obj.__dict__:
+            return None
+        return getattr(obj, self._field.source_field)
 
     def need_codenames(self, request: Request) -> Tuple[str, ...]:
         """
@@ -387,20 +579,19 @@ class ForeignKeyControl(BaseAdminControl, RelationSelectApi):
 
 # 如果是可选，怎么过滤的问题？反向过滤？
 class OneToOneControl(ForeignKeyControl):
-    async def get_selects(
-        self,
-        request: Request,
-        pk: Optional[str],
-        perPage: Optional[int],
-        page: Optional[int],
-        filter: Any = None,
-    ):
-        exist_pks = await self.field.model.all().values(self.field.source_field)
-        field_model_all = self.field.related_model.filter(
-            **{self.field.to_field + "__not_in": [i[self.field.source_field] for i in exist_pks]}
+    async def select_queryset(self, request: Request) -> QuerySet:
+        """
+        还没有被关联的对象，有反向关联的时候使用left join查询，否则使用not in子查询
+        """
+        field = self.field
+        if field.related_name:
+            return field.related_model.filter(
+                **{f"{field.related_name}__{field.source_field}__isnull": True}
+            )
+        exists = field.model.filter(**{field.source_field + "__isnull": False})
+        return field.related_model.filter(
+            **{field.to_field + "__not_in": Subquery(exists.values(field.source_field))}
         )
-        data = await field_model_all
-        return {"options": [{"value": i.pk, "label": str(i)} for i in data]}
 
     def get_column_inline(self, request: Request) -> Column:
         # todo 一对一可以使用inline
@@ -410,25 +601,49 @@ class OneToOneControl(ForeignKeyControl):
 class ManyToManyControl(BaseAdminControl, RelationSelectApi):
     _many = True
     _control_type = FormItemEnum.select
+    label_field: Optional[str] = None  # 作为标签的关联表字段，设置之后预加载只读取主键和该字段
+    bulk_size = 1000  # 批量写入中间表的时候每条语句的行数
 
     def prefetch(self) -> Optional[str]:
         return "prefetch"
 
+    def prefetch_queryset(self) -> Optional[QuerySet]:
+        if not self.label_field:
+            return None
+        related_model = self._field.related_model
+        return related_model.all().only(related_model._meta.pk_attr, self.label_field)
+
+    async def get_counts(self, request: Request, queryset: QuerySet) -> Dict[Any, int]:
+        """
+        查询queryset中每个对象关联的数量，返回{主键: 数量}
+        """
+        pk_attr = queryset.model._meta.pk_attr
+        count_name = self.name + "_count"
+        rows = await queryset.annotate(**{count_name: Count(self.name)}).values_list(
+            pk_attr, count_name
+        )
+        return dict(rows)
+
     def get_column(self, request: Request) -> Column:
         if not self._column:
             self._column = Operation(
                 label=self.label,
                 buttons=[
                     DialogAction(
-                        label="查看",
+                        label=f"${{{self.name}}} 项",
                         dialog=Dialog(
                             title=self.label,
                             body=CRUD(
                                 api=f"get:{self.prefix}/select/{self.name}?pk=$pk",
                                 columns=[
-                                    Column(label="主键", name="pk"),
+                                    Column(label="主键", name="value"),
                                     Column(label="名称", name="label"),
                                 ],
+                                filter=FilterModel(
+                                    title="",
+                                    body=[{"type": "input-text", "name": "term", "label": "搜索"}],
+                                ),
+                                syncLocation=False,
                             ),
                         ),
                     )
@@ -444,33 +659,33 @@ class ManyToManyControl(BaseAdminControl, RelationSelectApi):
         page: Optional[int],
         filter: Any = None,
     ):
+        """
+        pk不为空的时候返回该对象关联的数据，用于列表页的弹窗，传入perPage和page的时候分页
+        pk为空的时候返回表单中可以选择的选项，filter为搜索的关键字
+        """
         related_model = self._field.related_model
-        if pk is not None:
-            queryset = related_model.filter(**{self._field.related_name: pk})
-        else:
-            queryset = related_model.all()
-        # if filter:
-        #     if isinstance(filter, dict):
-        #         queryset = queryset.filter(**filter)
-        #     else:
-        #         queryset = queryset(filter)
-        if pk is not None:
-            count = await queryset.count()
-            data = await queryset
-            return ListDataWithPage(
-                total=count,
-                items=[{"value": i.pk, "label": str(i)} for i in data],
+        if pk is None:
+            return await self.get_options(request, related_model.all(), perPage, page, filter)
+        queryset = related_model.filter(**{self._field.related_name: pk})
+        queryset = search_queryset(queryset, filter, self.get_search_fields())
+        if perPage and page:
+            count, data = await asyncio.gather(
+                queryset.count(), page_queryset(queryset, perPage, page)
             )
         else:
-            data = await queryset
-            return {"options": [{"value": i.pk, "label": str(i)} for i in data]}
+            count, data = await asyncio.gather(queryset.count(), queryset)
+        return ListDataWithPage(total=count, items=self.to_options(data))
 
     def get_formitem(self, request: Request, codenames: Iterable[str]) -> FormItem:
         if not self._control:
+            api = f"get:{self.prefix}/select/{self.name}?perPage={settings.SELECT_PAGE_SIZE}"
             self._control = TransferItem(
                 name=self.name,
                 label=self.label,
-                source=f"get:{self.prefix}/select/{self.name}",
+                # 编辑页只返回选中的主键，选项接口带上选中的值来补全它们的标签
+                source=api + f"&value=${{{self.name}|join}}",
+                searchable=True,
+                searchApi=api + "&term=$term",
             )
             if self._field.null:
                 self._control.clearable = True
@@ -478,48 +693,100 @@ class ManyToManyControl(BaseAdminControl, RelationSelectApi):
 
     def amis_2_orm(self, value: List[dict]) -> Any:
         if isinstance(value, str):
-            return value.split(",")
+            return [i for i in value.split(",") if i]
         return [i["value"] for i in value]
 
     async def validate(self, value: Any, is_create=False) -> Any:
+        """
+        返回数据库中存在的关联对象的主键，不存在的主键会被忽略
+        """
         if value is not None:
             pks = self.amis_2_orm(value)
             if len(pks) > 0:
-                return await self._field.related_model.filter(pk__in=pks)
+                related_model = self._field.related_model
+                return await related_model.filter(pk__in=pks).values_list(
+                    related_model._meta.pk_attr, flat=True
+                )
         return []
 
+    def through_table(self) -> Tuple[Table, fields.Field, fields.Field]:
+        """
+        返回(中间表, 当前表主键的转换字段, 关联表主键的转换字段)
+        """
+        return (
+            Table(self._field.through),
+            self._field.model._meta.pk,
+            self._field.related_model._meta.pk,
+        )
+
+    async def get_related_pks(self, obj: Model, db: BaseDBAsyncClient) -> set:
+        """
+        从中间表读取obj已经关联的主键
+        """
+        table, pk_field, related_pk_field = self.through_table()
+        forward_key = self._field.forward_key
+        query = (
+            db.query_class.from_(table)
+            .where(table[self._field.backward_key] == pk_field.to_db_value(obj.pk, obj))
+            .select(table[forward_key])
+        )
+        _, rows = await db.execute_query(str(query))
+        return {related_pk_field.to_python_value(row[forward_key]) for row in rows}
+
+    async def write_related_pks(
+        self, obj: Model, db: BaseDBAsyncClient, add_pks: Iterable[Any], remove_pks: Iterable[Any]
+    ):
+        """
+        批量写入中间表，新增和删除每bulk_size行各生成一条语句
+        """
+        table, pk_field, related_pk_field = self.through_table()
+        forward_key, backward_key = self._field.forward_key, self._field.backward_key
+        obj_pk = pk_field.to_db_value(obj.pk, obj)
+        add_pks = [related_pk_field.to_db_value(i, None) for i in add_pks]
+        remove_pks = [related_pk_field.to_db_value(i, None) for i in remove_pks]
+        for pks in chunk(remove_pks, self.bulk_size):
+            query = (
+                db.query_class.from_(table)
+                .where(table[backward_key] == obj_pk)
+                .where(table[forward_key].isin(pks))
+                .delete()
+            )
+            await db.execute_query(str(query))
+        for pks in chunk(add_pks, self.bulk_size):
+            query = db.query_class.into(table).columns(table[forward_key], table[backward_key])
+            for pk in pks:
+                query = query.insert(pk, obj_pk)
+            await db.execute_query(str(query))
+
+    async def save_related_pks(self, obj: Model, pks: Iterable[Any]):
+        """
+        把obj的关联对象设置为pks，在一个事务里面比较中间表中的主键集合，只写入变化的部分
+        """
+        async with in_transaction(self._field.model._meta.default_connection) as db:
+            exist_pks = await self.get_related_pks(obj, db)
+            pks = set(pks)
+            await self.write_related_pks(obj, db, pks - exist_pks, exist_pks - pks)
+
+    async def get_value(self, request: Request, obj: Model) -> Any:
+        """
+        编辑页不预加载关联对象，只从中间表读取已经关联的主键
+        """
+        return sorted(await self.get_related_pks(obj, self._field.model._meta.db))
+
     async def set_value(self, request: Request, obj: Model, value: Any) -> Optional[Coroutine]:
-        value = await self.validate(value)
-        field: fields.ManyToManyRelation = getattr(obj, self.name)
+        pks = await self.validate(value)
         if obj.pk is None:
-            if value:  # create
-                return field.add(*value)
+            if pks:  # create
+                return self.save_related_pks(obj, pks)
             return None
-        add_field = []
-        remove_field = []
-        for i in field:
-            for j in value:
-                if j.pk == i.pk:
-                    break
-            else:
-                remove_field.append(i)
-        for j in value:
-            for i in field:
-                if j.pk == i.pk:
-                    break
-            else:
-                add_field.append(j)
-        if len(remove_field) > 0:
-            await field.remove(*remove_field)
-        if len(add_field) > 0:
-            await field.add(*add_field)
+        await self.save_related_pks(obj, pks)
         return None
 
     def get_column_inline(self, request: Request) -> Column:
         raise AttributeError("manytomany field can not be used in column inline.")
 
     def orm_2_amis(self, value: Any) -> Any:
-        return [{"label": str(i), "value": i.pk} for i in value]
+        return [{"label": self.get_label(i), "value": i.pk} for i in value]
 
 
 # todo 增加创建按钮?
@@ -530,21 +797,35 @@ class BackwardFKControl(ManyToManyControl):
     def prefetch(self) -> Optional[str]:
         return "prefetch"
 
+    def prefetch_queryset(self) -> Optional[QuerySet]:
+        if not self.label_field:
+            return None
+        related_model = self._field.related_model
+        # 需要读取外键列才能把数据关联到对应的对象上
+        return related_model.all().only(
+            related_model._meta.pk_attr, self.label_field, self._field.relation_field
+        )
+
     def get_column(self, request: Request) -> Column:
         if not self._column:
             self._column = Operation(
                 label=self.label,
                 buttons=[
                     DialogAction(
-                        label="查看",
+                        label=f"${{{self.name}}} 项",
                         dialog=Dialog(
                             title=self.label,
                             body=CRUD(
                                 api=f"get:{self.prefix}/select/{self.name}?pk=$pk",
                                 columns=[
-                                    Column(label="主键", name="pk"),
+                                    Column(label="主键", name="value"),
                                     Column(label="名称", name="label"),
                                 ],
+                                filter=FilterModel(
+                                    title="",
+                                    body=[{"type": "input-text", "name": "term", "label": "搜索"}],
+                                ),
+                                syncLocation=False,
                             ),
                         ),
                     )
@@ -552,34 +833,11 @@ class BackwardFKControl(ManyToManyControl):
             )
         return self._column
 
-    async def get_selects(
-        self,
-        request: Request,
-        pk: Optional[str],
-        perPage: Optional[int],
-        page: Optional[int],
-        filter: Any = None,
-    ):
+    async def get_value(self, request: Request, obj: Model) -> Any:
         related_model = self._field.related_model
-        if pk is not None:
-            queryset = related_model.filter(**{self._field.related_name: pk})
-        else:
-            queryset = related_model.all()
-        # if filter:
-        #     if isinstance(filter, dict):
-        #         queryset = queryset.filter(**filter)
-        #     else:
-        #         queryset = queryset(filter)
-        if pk is not None:
-            count = await queryset.count()
-            data = await queryset
-            return ListDataWithPage(
-                total=count,
-                items=[{"value": i.pk, "label": str(i)} for i in data],
-            )
-        else:
-            data = await queryset
-            return {"options": [{"value": i.pk, "label": str(i)} for i in data]}
+        return await related_model.filter(**{self._field.relation_field: obj.pk}).values_list(
+            related_model._meta.pk_attr, flat=True
+        )
 
     def get_formitem(self, request: Request, codenames: Iterable[str]) -> FormItem:
         raise AttributeError(f"BackwardFKControl field {self.name} can not be created")
@@ -590,10 +848,16 @@ class BackwardFKControl(ManyToManyControl):
         )
 
     def orm_2_amis(self, value: Any) -> Any:
-        return [{"label": str(i), "value": i.pk} for i in value]
+        return [{"label": self.get_label(i), "value": i.pk} for i in value]
 
 
 class BackwardOneToOneControl(OneToOneControl):
+    def value_path(self) -> str:
+        return self.name + "__" + self.related_key()
+
+    def related_key(self) -> str:
+        return self.field.related_model._meta.pk_attr
+
     def get_column(self, request: Request) -> Column:
         if not self._column:
             self._column = Custom(
@@ -606,10 +870,12 @@ class BackwardOneToOneControl(OneToOneControl):
 
     def get_formitem(self, request: Request, codenames: Iterable[str]) -> FormItem:
         if not self._control:
+            api = f"get:{self.prefix}/select/{self.name}?perPage={settings.SELECT_PAGE_SIZE}"
             self._control = SelectItem(
                 name=self.name,
                 label=self.label,
-                source=f"get:{self.prefix}/select/{self.name}",
+                source=api + self.selected_query(),
+                autoComplete=api + "&term=$term",
                 labelField="label",
                 valueField="value",
                 clearable=True,
@@ -624,31 +890,8 @@ class BackwardOneToOneControl(OneToOneControl):
             self.need_perms = (self.related_prefix() + "_create",)
         return self.need_perms
 
-    async def get_selects(
-        self,
-        request: Request,
-        pk: Optional[str],
-        perPage: Optional[int],
-        page: Optional[int],
-        filter: Any = None,
-    ):
-        field_model_all = self.field.related_model.filter(**{self.field.relation_field: None})
-        # if filter:
-        #     if isinstance(filter, dict):
-        #         field_model_all = self._field.related_model.filter(**filter)
-        #     else:
-        #         field_model_all = self._field.related_model.filter(filter)
-        # if perPage is not None and page is not None:
-        #     field_model = field_model_all.limit(perPage).offset((page - 1) * perPage)
-        #     count = await field_model_all.count()
-        #     data = await field_model
-        #     return ListDataWithPage(
-        #         total=count,
-        #         items=[{"value": i.pk, "label": str(i)} for i in data],
-        #     )
-        # else:
-        data = await field_model_all
-        return {"options": [{"value": i.pk, "label": str(i)} for i in data]}
+    async def select_queryset(self, request: Request) -> QuerySet:
+        return self.field.related_model.filter(**{self.field.relation_field: None})
 
     async def set_value(self, request: Request, obj: Model, value: Any):
         """
@@ -656,6 +899,9 @@ class BackwardOneToOneControl(OneToOneControl):
         """
         pass
 
+    def assigned_value(self, obj: Model) -> Any:
+        return None
+
 
 class FileControl(BaseAdminControl):
     _control_type = FormItemEnum.input_file
@@ -800,15 +1046,21 @@ class Password(BaseControl):
     async def get_value(self, request: Request, obj: Model) -> Any:
         return None
 
+    def values_fields(self) -> Tuple[str, ...]:
+        return ()
+
+    async def get_values(self, request: Request, rows: List[dict]) -> List[Any]:
+        return [None] * len(rows)
+
     async def set_value(self, request: Request, obj: Model, value: Any):
         if obj.pk is not None:
             old_password = getattr(obj, self.name)
             if value and value != old_password and len(value) > 0:
-                setattr(obj, self.name, make_password(value))
+                setattr(obj, self.name, await amake_password(value))
         else:
             if not value:
                 raise TmpValueError("password can not be none.")
-            await super().set_value(request, obj, make_password(value))
+            await super().set_value(request, obj, await amake_password(value))
 
     def get_formitem(self, request: Request, codenames: Iterable[str]) -> FormItem:
         if not self._control:
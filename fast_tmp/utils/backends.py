@@ -0,0 +1,198 @@
+"""
+多个worker之间共享状态的后端
+memory: 只在当前进程内有效，主要用于单进程部署和测试
+sqlite:///path/to/file.db: 使用本地sqlite文件，同一台机器上的多个worker共享
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from abc import abstractmethod
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class StateBackend:
+    """
+    共享状态后端的基类
+    """
+
+    blocking = False  # 读写可能阻塞（例如等待文件锁）的后端，异步方法在线程池中执行
+
+    @abstractmethod
+    def get_version(self, name: str) -> int:
+        """
+        获取版本号，不存在则为0
+        """
+
+    @abstractmethod
+    def incr_version(self, name: str) -> int:
+        """
+        版本号加一，并返回新的版本号
+        """
+
+    async def aget_version(self, name: str) -> int:
+        return await self.run(self.get_version, name)
+
+    async def aincr_version(self, name: str) -> int:
+        return await self.run(self.incr_version, name)
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        在异步代码中调用后端的方法，阻塞的后端放到线程池中执行，不占用事件循环
+        """
+        if not self.blocking:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    @abstractmethod
+    def get_tokens(self, key: str, capacity: float, rate: float) -> float:
+        """
+        令牌桶当前的令牌数
+        capacity: 桶的容量，新建的桶是满的
+        rate: 每秒补充的令牌数
+        """
+
+    @abstractmethod
+    def consume(self, key: str, capacity: float, rate: float) -> bool:
+        """
+        从令牌桶中取出一个令牌，令牌不足则返回False
+        """
+
+
+def _refill(tokens: float, updated: float, now: float, capacity: float, rate: float) -> float:
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+class MemoryBackend(StateBackend):
+    max_buckets = 10000
+
+    def __init__(self):
+        self._versions: Dict[str, int] = {}
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def get_version(self, name: str) -> int:
+        return self._versions.get(name, 0)
+
+    def incr_version(self, name: str) -> int:
+        with self._lock:
+            version = self._versions.get(name, 0) + 1
+            self._versions[name] = version
+        return version
+
+    def get_tokens(self, key: str, capacity: float, rate: float) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return capacity
+        return _refill(bucket[0], bucket[1], time.time(), capacity, rate)
+
+    def consume(self, key: str, capacity: float, rate: float) -> bool:
+        with self._lock:
+            now = time.time()
+            tokens = self.get_tokens(key, capacity, rate)
+            if tokens < 1:
+                return False
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.max_buckets:
+                # 满的桶和不存在的桶等价，可以直接删除
+                for k in [
+                    k
+                    for k, (t, u) in self._buckets.items()
+                    if _refill(t, u, now, capacity, rate) >= capacity
+                ]:
+                    del self._buckets[k]
+        return True
+
+
+class SQLiteBackend(StateBackend):
+    blocking = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # fork之后不能复用父进程的连接
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(
+                self.path, timeout=5, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS fast_tmp_version "
+                "(name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS fast_tmp_bucket "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get_version(self, name: str) -> int:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT value FROM fast_tmp_version WHERE name=?", (name,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def incr_version(self, name: str) -> int:
+        with self._lock:
+            conn = self.conn
+            conn.execute(
+                "INSERT INTO fast_tmp_version (name, value) VALUES (?, 1) "
+                "ON CONFLICT(name) DO UPDATE SET value=value+1",
+                (name,),
+            )
+            row = conn.execute(
+                "SELECT value FROM fast_tmp_version WHERE name=?", (name,)
+            ).fetchone()
+        return row[0]
+
+    def _get_bucket(self, conn: sqlite3.Connection, key: str) -> Optional[Tuple[float, float]]:
+        return conn.execute(
+            "SELECT tokens, updated FROM fast_tmp_bucket WHERE key=?", (key,)
+        ).fetchone()
+
+    def get_tokens(self, key: str, capacity: float, rate: float) -> float:
+        with self._lock:
+            bucket = self._get_bucket(self.conn, key)
+        if bucket is None:
+            return capacity
+        return _refill(bucket[0], bucket[1], time.time(), capacity, rate)
+
+    def consume(self, key: str, capacity: float, rate: float) -> bool:
+        with self._lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                bucket = self._get_bucket(conn, key)
+                tokens = capacity if bucket is None else _refill(*bucket, now, capacity, rate)
+                if tokens < 1:
+                    return False
+                conn.execute(
+                    "INSERT OR REPLACE INTO fast_tmp_bucket (key, tokens, updated) VALUES (?, ?, ?)",
+                    (key, tokens - 1, now),
+                )
+                return True
+            finally:
+                conn.execute("COMMIT")
+
+
+def get_backend(url: str) -> Optional[StateBackend]:
+    """
+    根据配置字符串创建后端，为空则返回None
+    """
+    if not url:
+        return None
+    if url == "memory":
+        return MemoryBackend()
+    if url.startswith("sqlite://"):
+        return SQLiteBackend(url.split("sqlite://", 1)[1])
+    raise ValueError(f"unknown backend: {url}")
@@ -0,0 +1,75 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    进程内的LRU缓存，每个值带有过期时间
+    maxsize: 最多缓存的数量，超出之后淘汰最久未使用的值
+    ttl: 默认过期时间（秒）
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        expire, value = item
+        if expire <= time.time():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = None,
+        expire: Optional[float] = None,
+    ):
+        """
+        写入缓存
+        ttl: 本条数据的过期时间（秒），为空则使用默认值
+        expire: 绝对过期时间戳，优先于ttl
+        """
+        if self.maxsize <= 0:
+            return
+        if expire is None:
+            expire = time.time() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expire, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def delete_where(self, func: Callable[[Hashable, Any], bool]):
+        """
+        删除所有满足条件的缓存
+        """
+        for key in [k for k, (_, v) in self._data.items() if func(k, v)]:
+            del self._data[key]
+
+    def clear(self):
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        item = self._data.get(key)
+        return item is not None and item[0] > time.time()
+
+    def __len__(self) -> int:
+        return len(self._data)
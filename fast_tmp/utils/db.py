@@ -7,9 +7,14 @@
 @Software: PyCharm
 @info    :
 """
-from typing import Dict
+import json
+import logging
+from contextvars import ContextVar, Token
+from typing import Any, Dict, Optional
 
-from tortoise import Tortoise
+from tortoise import BaseDBAsyncClient, Tortoise
+from tortoise.exceptions import OperationalError
+from tortoise.queryset import QuerySet
 
 
 def init_model(settings):
@@ -17,3 +22,123 @@ def init_model(settings):
     apps: Dict[str, dict] = tortoise_setting["apps"]
     for app_name, value in apps.items():
         Tortoise.init_models(value["models"], app_name)
+
+
+async def _fetch_value(client: BaseDBAsyncClient, sql: str, values: list) -> Any:
+    """
+    返回第一行第一列的值，按位置读取，不依赖列名（postgres的EXPLAIN输出列名为QUERY PLAN）
+    """
+    try:
+        _, rows = await client.execute_query(sql, values)
+    except OperationalError:
+        return None
+    if not rows:
+        return None
+    row = rows[0]
+    # mysql返回dict，直接迭代得到的是列名
+    return next(iter(row.values() if isinstance(row, dict) else row), None)
+
+
+async def estimate_count(queryset: QuerySet) -> Optional[int]:
+    """
+    根据数据库的统计信息估算查询结果的行数，无法估算则返回None
+    没有过滤条件的时候读取表的统计信息：
+        postgres: pg_class.reltuples
+        mysql: information_schema.TABLES.TABLE_ROWS
+        sqlite: sqlite_stat1，需要执行过ANALYZE
+    有过滤条件的时候只有postgres可以通过EXPLAIN估算
+    """
+    model = queryset.model
+    client = model._meta.db
+    dialect = client.capabilities.dialect
+    table = model._meta.db_table
+    if queryset._q_objects:
+        if dialect != "postgres":
+            return None
+        plan = await _fetch_value(client, "EXPLAIN (FORMAT JSON) " + queryset.sql(), [])
+        if plan is None:
+            return None
+        try:
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"])
+        except (LookupError, TypeError, ValueError):  # 无法解析的时候使用精确统计
+            return None
+    if dialect == "postgres":
+        value = await _fetch_value(
+            client, "SELECT reltuples AS value FROM pg_class WHERE oid = to_regclass($1)", [table]
+        )
+        # 没有执行过ANALYZE的表为-1
+        return int(value) if value is not None and value >= 0 else None
+    if dialect == "mysql":
+        value = await _fetch_value(
+            client,
+            "SELECT TABLE_ROWS AS value FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            [table],
+        )
+        return int(value) if value is not None else None
+    if dialect == "sqlite":
+        value = await _fetch_value(
+            client, "SELECT stat AS value FROM sqlite_stat1 WHERE tbl = ? LIMIT 1", [table]
+        )
+        return int(value.split()[0]) if value else None
+    return None
+
+
+_query_counter: ContextVar[Optional["QueryCounter"]] = ContextVar("query_counter", default=None)
+_db_logger = logging.getLogger("tortoise.db_client")
+
+
+class _QueryCountFilter(logging.Filter):
+    """
+    tortoise执行sql的时候会输出"%s: %s"格式的debug日志，通过日志统计sql的数量
+    """
+
+    suppress = False  # 日志级别是为了计数临时调低的，不输出debug日志
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        counter = _query_counter.get()
+        if counter is not None and record.msg == "%s: %s":
+            counter.count += 1
+        return not self.suppress or record.levelno > logging.DEBUG
+
+
+_query_count_filter = _QueryCountFilter()
+_active_counters = 0
+_db_logger_level = logging.NOTSET
+
+
+class QueryCounter:
+    """
+    统计with代码块中执行的sql数量，包括其中创建的子任务
+    enabled为False的时候不统计
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.count = 0
+        self._token: Optional[Token] = None
+
+    def __enter__(self) -> "QueryCounter":
+        global _active_counters, _db_logger_level
+        if not self.enabled:
+            return self
+        if _active_counters == 0:
+            _db_logger_level = _db_logger.level
+            _query_count_filter.suppress = not _db_logger.isEnabledFor(logging.DEBUG)
+            _db_logger.addFilter(_query_count_filter)
+            _db_logger.setLevel(logging.DEBUG)
+        _active_counters += 1
+        self._token = _query_counter.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        global _active_counters
+        if not self.enabled:
+            return
+        _query_counter.reset(self._token)  # type: ignore
+        _active_counters -= 1
+        if _active_counters == 0:
+            _db_logger.removeFilter(_query_count_filter)
+            _db_logger.setLevel(_db_logger_level)
@@ -3,9 +3,12 @@ from datetime import datetime, timedelta
 from jose import jwt  # type: ignore
 
 from fast_tmp.conf import settings
+from fast_tmp.utils.cache import TTLCache
 
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
+# 已经校验过的token，缓存到token过期为止
+token_cache = TTLCache(maxsize=settings.TOKEN_CACHE_SIZE)
 
 
 def create_access_token(data: dict, expires_delta: timedelta):
@@ -22,4 +25,12 @@ def create_access_token(data: dict, expires_delta: timedelta):
 def decode_access_token(
     token: str,
 ):
-    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    """
+    解析token，同一个token只校验一次签名，之后从缓存读取，过期的token不会从缓存返回
+    """
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        if isinstance(payload.get("exp"), (int, float)):
+            token_cache.set(token, payload, expire=payload["exp"])
+    return dict(payload)
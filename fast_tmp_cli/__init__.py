@@ -28,7 +28,7 @@ async def create_superuser(username: str, password: str):
         print(f"{username} has been created")
         exit(1)
     user = User(username=username, is_superuser=True, is_staff=True, name=username)
-    user.set_password(password)
+    await user.aset_password(password)
     await user.save()
     sys.stdout.write(f"success create {username}\n")
 
@@ -52,6 +52,30 @@ def startproject():
     cookiecutter(os.path.join(basedir, "tpl/project"))
 
 
+@app.command("calibrate-hasher")
+def calibrate_hasher(target_ms: int = 250, rounds: int = 3):
+    """
+    测试本机PBKDF2的速度，推荐单次密码校验耗时为target_ms毫秒的迭代次数
+    """
+    import hashlib
+    import time
+
+    sample = 100000
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        hashlib.pbkdf2_hmac("sha256", b"fast-tmp", b"calibrate-salt", sample)
+        cost = time.perf_counter() - start
+        best = cost if best is None else min(best, cost)
+    per_second = sample / best
+    recommended = max(int(per_second * target_ms / 1000) // 10000 * 10000, 10000)
+    sys.stdout.write(f"pbkdf2_sha256: {int(per_second)} iterations/s\n")
+    if settings:
+        current = settings.PASSWORD_HASH_ITERATIONS
+        sys.stdout.write(f"current: {current} iterations, {current / per_second * 1000:.0f}ms\n")
+    sys.stdout.write(f"recommended for {target_ms}ms: PASSWORD_HASH_ITERATIONS = {recommended}\n")
+
+
 @app.command()
 def downloadamis():
     sys.stdout.write("download amis sdk from : https://github.com/baidu/amis/releases/download/v2.2.0/sdk.tar.gz")
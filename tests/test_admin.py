@@ -30,6 +30,58 @@ class TestSite(BaseSite):
         user_html_schema = await self.client.get("/admin/user/schema")
         print(user_html_schema.json())
         self.assertEqual(
-            '{"status":0,"msg":"","data":{"type":"page","title":"用户","body":[{"type":"button","label":"新增","actionType":"dialog","level":"primary","dialog":{"title":"新增","size":"md","body":{"type":"form","name":"新增用户","title":"新增用户","api":"post:user/create","body":[{"type":"input-text","name":"username","label":"用户名","required":true},{"type":"input-password","name":"password","label":"密码"},{"type":"input-text","name":"name","label":"名称","required":true},{"type":"transfer","name":"groups","label":"groups","sortable":false,"source":"get:user/select/groups","searchable":false,"statistics":true,"selectMode":"list"},{"type":"select","name":"is_active","label":"活跃","value":"True","description":"(False则账户无法使用)","required":true,"options":["True","False"]},{"type":"select","name":"is_superuser","label":"超级管理员","value":"False","required":true,"options":["True","False"]},{"type":"select","name":"is_staff","label":"职员","value":"False","description":"(False则无法登录管理界面)","required":true,"options":["True","False"]}]}}},{"type":"crud","api":"user/list","name":"user","columns":[{"name":"id","label":"id","sortable":true},{"name":"name","label":"名称","sortable":true},{"name":"username","label":"用户名","sortable":true},{"name":"is_active","label":"活跃","quickEdit":{"model":"inline","type":"select","saveImmediately":true,"options":["True","False"]}},{"name":"is_superuser","label":"超级管理员","quickEdit":{"model":"inline","type":"select","saveImmediately":true,"options":["True","False"]}},{"name":"is_staff","label":"职员","quickEdit":{"model":"inline","type":"select","saveImmediately":true,"options":["True","False"]}},{"type":"operation","name":"","label":"操作","buttons":[{"type":"button","label":"修改","actionType":"dialog","level":"link","dialog":{"title":"修改","size":"md","body":{"type":"form","name":"修改用户","title":"修改用户","api":"put:user/update/$pk","initApi":"get:user/update/$pk","body":[{"type":"input-text","name":"username","label":"用户名","required":true},{"type":"input-password","name":"password","label":"密码"},{"type":"input-text","name":"name","label":"名称","required":true},{"type":"transfer","name":"groups","label":"groups","sortable":false,"source":"get:user/select/groups","searchable":false,"statistics":true,"selectMode":"list"},{"type":"select","name":"is_active","label":"活跃","value":"True","description":"(False则账户无法使用)","required":true,"options":["True","False"]},{"type":"select","name":"is_superuser","label":"超级管理员","value":"False","required":true,"options":["True","False"]},{"type":"select","name":"is_staff","label":"职员","value":"False","description":"(False则无法登录管理界面)","required":true,"options":["True","False"]}]}}},{"type":"button","label":"删除","actionType":"ajax","level":"link","className":"text-danger","confirmText":"确认要删除？","api":"delete:user/delete/$pk"}]}],"affixHeader":false,"quickSaveItemApi":"user/patch/$pk","syncLocation":false}]}}',
+            '{"status":0,"msg":"","data":{"type":"page","title":"用户","body":[{"type":"button","label":"新增","actionType":"dialog","level":"primary","dialog":{"title":"新增","size":"md","body":{"type":"form","name":"新增用户","title":"新增用户","api":"post:user/create","body":[{"type":"input-text","name":"username","label":"用户名","required":true},{"type":"input-password","name":"password","label":"密码"},{"type":"input-text","name":"name","label":"名称","required":true},{"type":"transfer","name":"groups","label":"groups","sortable":false,"source":"get:user/select/groups?perPage=20&value=${groups|join}","searchable":true,"searchApi":"get:user/select/groups?perPage=20&term=$term","statistics":true,"selectMode":"list"},{"type":"select","name":"is_active","label":"活跃","value":"True","description":"(False则账户无法使用)","required":true,"options":["True","False"]},{"type":"select","name":"is_superuser","label":"超级管理员","value":"False","required":true,"options":["True","False"]},{"type":"select","name":"is_staff","label":"职员","value":"False","description":"(False则无法登录管理界面)","required":true,"options":["True","False"]}]}}},{"type":"crud","api":"user/list","name":"user","columns":[{"name":"id","label":"id","sortable":true},{"name":"name","label":"名称","sortable":true},{"name":"username","label":"用户名","sortable":true},{"name":"is_active","label":"活跃","quickEdit":{"model":"inline","type":"select","saveImmediately":true,"options":["True","False"]}},{"name":"is_superuser","label":"超级管理员","quickEdit":{"model":"inline","type":"select","saveImmediately":true,"options":["True","False"]}},{"name":"is_staff","label":"职员","quickEdit":{"model":"inline","type":"select","saveImmediately":true,"options":["True","False"]}},{"type":"operation","name":"","label":"操作","buttons":[{"type":"button","label":"修改","actionType":"dialog","level":"link","dialog":{"title":"修改","size":"md","body":{"type":"form","name":"修改用户","title":"修改用户","api":"put:user/update/$pk","initApi":"get:user/update/$pk","body":[{"type":"input-text","name":"username","label":"用户名","required":true},{"type":"input-password","name":"password","label":"密码"},{"type":"input-text","name":"name","label":"名称","required":true},{"type":"transfer","name":"groups","label":"groups","sortable":false,"source":"get:user/select/groups?perPage=20&value=${groups|join}","searchable":true,"searchApi":"get:user/select/groups?perPage=20&term=$term","statistics":true,"selectMode":"list"},{"type":"select","name":"is_active","label":"活跃","value":"True","description":"(False则账户无法使用)","required":true,"options":["True","False"]},{"type":"select","name":"is_superuser","label":"超级管理员","value":"False","required":true,"options":["True","False"]},{"type":"select","name":"is_staff","label":"职员","value":"False","description":"(False则无法登录管理界面)","required":true,"options":["True","False"]}]}}},{"type":"button","label":"删除","actionType":"ajax","level":"link","className":"text-danger","confirmText":"确认要删除？","api":"delete:user/delete/$pk"}]}],"affixHeader":false,"quickSaveItemApi":"user/patch/$pk","syncLocation":false}]}}',
             user_html_schema.text,
         )
+
+    async def test_login_throttle(self):
+        from fast_tmp.admin import throttle
+        from fast_tmp.utils.backends import MemoryBackend
+
+        old_throttle = throttle.login_throttle
+        throttle.login_throttle = throttle.LoginThrottle(
+            MemoryBackend(), username_burst=2, username_per_minute=1
+        )
+        try:
+            for _ in range(2):
+                response = await self.client.post(
+                    "/admin/login", data={"username": "admin", "password": "123"}
+                )
+                assert response.status_code == 200
+            # 令牌耗尽之后，即使密码正确也直接拒绝
+            response = await self.client.post(
+                "/admin/login", data={"username": "admin", "password": "123456"}
+            )
+            assert response.status_code == 429
+            # 其他用户不受影响
+            await self.create_user("user1")
+            await self.login("user1")
+            assert throttle.login_throttle.verifying == 0
+            # 开启ip限流之后同一个ip的其他用户名也会被拒绝
+            throttle.login_throttle = throttle.LoginThrottle(MemoryBackend(), ip_burst=1)
+            response = await self.client.post(
+                "/admin/login", data={"username": "user1", "password": "123"}
+            )
+            assert response.status_code == 200
+            response = await self.client.post(
+                "/admin/login", data={"username": "admin", "password": "123456"}
+            )
+            assert response.status_code == 429
+        finally:
+            throttle.login_throttle = old_throttle
+
+    async def test_rehash_on_login(self):
+        from fast_tmp.contrib.auth.hashers import PBKDF2PasswordHasher
+        from fast_tmp.models import User
+
+        hasher = PBKDF2PasswordHasher()
+        user = await self.create_user("user2")
+        user.password = hasher.encode("123456", hasher.salt(), 1000)
+        await user.save()
+        user = await User.get(username="user2")
+        await self.login("user2")
+        new_user = await User.get(username="user2")
+        assert hasher.decode(new_user.password)["iterations"] == hasher.iterations
+        assert new_user.update_time == user.update_time  # 已签发的token不失效
+        response = await self.client.get("/admin/site")
+        assert response.status_code == 200
@@ -0,0 +1,593 @@
+"""
+测试列表页的查询
+"""
+import datetime
+import json
+from decimal import Decimal
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock, PropertyMock, patch
+from urllib.parse import urlencode
+
+from starlette.requests import Request
+from tortoise import Model, connections
+
+from fast_tmp.admin.site import GroupAdmin
+from fast_tmp.conf import settings
+from fast_tmp.exceptions import FieldsError, NotFoundError
+from fast_tmp.models import User
+from fast_tmp.responses import ListDataWithEstimate
+from fast_tmp.site import ModelAdmin, count_cache
+from fast_tmp.site.base import RowSerializer
+from fast_tmp.site.field import DateControl, PkControl, StrControl, search_queryset
+from fast_tmp.utils.db import QueryCounter, estimate_count
+
+from tests.admin import AuthorModel, BookModel, RoleModel
+from tests.base import BaseSite
+from tests.testmodels import Address, Author, Book, Event, Role, Team, Ticket, Tournament
+
+
+def make_request(method: str = "GET", **params) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": method,
+            "query_string": urlencode(params).encode(),
+            "headers": [],
+        }
+    )
+
+
+class AuthorKeysetModel(AuthorModel):
+    keyset_pagination = True
+    ordering = ("name", "birthday")
+
+
+class AuthorFilterModel(AuthorModel):
+    filters = ("name",)
+
+
+class TicketKeysetModel(ModelAdmin):
+    model = Ticket
+    list_display = ("name",)
+    ordering = ("name",)
+    keyset_pagination = True
+
+
+class TestKeysetPagination(BaseSite):
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        await Author.bulk_create(
+            [
+                Author(name=f"author{i:02}", birthday=datetime.date(2000, 1, 1 + i % 3))
+                for i in range(25)
+            ]
+        )
+
+    async def walk(self, page_model, **params):
+        names = []
+        cursor = ""
+        for page in range(1, 10):
+            data = await page_model.list(
+                make_request(cursor=cursor, **params),
+                10,
+                page,
+                params.get("orderBy"),
+                params.get("orderDir"),
+            )
+            names.extend(i["name"] for i in data.items)
+            cursor = data.cursor
+            if not data.hasNext:
+                break
+        return names
+
+    async def test_keyset(self):
+        page_model = AuthorKeysetModel(prefix="author_keyset")
+        names = await self.walk(page_model)
+        self.assertEqual([f"author{i:02}" for i in range(25)], names)
+        # 排序字段有重复值的时候使用主键保证顺序
+        names = await self.walk(page_model, orderBy="birthday", orderDir="desc")
+        authors = await Author.all().order_by("-birthday", "-id")
+        self.assertEqual([i.name for i in authors], names)
+        # 向前翻页时退回到offset查询
+        first = await page_model.list(make_request(), 10, 1)
+        second = await page_model.list(make_request(cursor=first.cursor), 10, 2)
+        third = await page_model.list(make_request(cursor=second.cursor), 10, 3)
+        back = await page_model.list(make_request(cursor=third.cursor), 10, 2)
+        self.assertEqual(second.items, back.items)
+        self.assertFalse(third.hasNext)
+        schema = page_model.get_crud(make_request(), ["author_list"])[0]
+        self.assertEqual("author_keyset/list?cursor=${cursor}", schema.api)
+
+    async def test_uuid_keyset(self):
+        await Ticket.bulk_create([Ticket(name=f"ticket{i % 5}") for i in range(25)])
+        # 主键为uuid，排序字段有重复值的时候游标中记录uuid
+        names = await self.walk(TicketKeysetModel(prefix="ticket_keyset"))
+        tickets = await Ticket.all().order_by("name", "id")
+        self.assertEqual([i.name for i in tickets], names)
+
+
+class TestListTotal(BaseSite):
+    async def test_total(self):
+        await Author.bulk_create(
+            [Author(name=f"author{i}", birthday="2000-01-01") for i in range(5)]
+        )
+        page_model = AuthorFilterModel(prefix="author_total")
+        data = await page_model.list(make_request(), 2, 1)
+        self.assertEqual(5, data.total)
+        self.assertNotIsInstance(data, ListDataWithEstimate)
+        # 缓存总数
+        with patch.object(settings, "LIST_COUNT_CACHE_TTL", 60):
+            count_cache.clear()
+            await page_model.list(make_request(), 2, 1)
+            await Author.create(name="author5", birthday="2000-01-01")
+            data = await page_model.list(make_request(), 2, 2)
+            self.assertEqual(5, data.total)
+            self.assertEqual(1, count_cache.hits)
+            data = await page_model.list(make_request(name="author5"), 2, 1)
+            self.assertEqual(1, data.total)
+            await page_model.delete(make_request(), "1")
+            data = await page_model.list(make_request(), 2, 1)
+            self.assertEqual(5, data.total)
+        # 超过阈值之后使用数据库统计信息中的行数
+        await connections.get("default").execute_script("ANALYZE")
+        with patch.object(settings, "LIST_COUNT_ESTIMATE_THRESHOLD", 3):
+            data = await page_model.list(make_request(), 2, 1)
+            self.assertIsInstance(data, ListDataWithEstimate)
+            self.assertEqual(5, data.total)
+            data = await page_model.list(make_request(name="author5"), 2, 1)
+            self.assertNotIsInstance(data, ListDataWithEstimate)
+
+    async def test_estimate_postgres(self):
+        client = MagicMock()
+        client.capabilities.dialect = "postgres"
+        queryset = Author.filter(name="author")
+        with patch.object(type(Author._meta), "db", new_callable=PropertyMock) as db:
+            db.return_value = client
+            # EXPLAIN的输出列名为QUERY PLAN
+            plan = [{"Plan": {"Plan Rows": 42}}]
+            client.execute_query = AsyncMock(return_value=(1, [{"QUERY PLAN": json.dumps(plan)}]))
+            self.assertEqual(42, await estimate_count(queryset))
+            # 无法解析的时候返回None，使用精确统计
+            client.execute_query = AsyncMock(return_value=(1, [{"QUERY PLAN": "[{}]"}]))
+            self.assertIsNone(await estimate_count(queryset))
+
+
+class BookProjectionModel(BookModel):
+    list_projection = True
+
+
+class BookLabelModel(BookModel):
+    list_projection = True
+    label_fields = {"author": "name"}
+
+
+class RoleProjectionModel(RoleModel):
+    list_projection = True
+
+
+class TestListProjection(BaseSite):
+    async def test_projection(self):
+        author = await Author.create(name="author", birthday="2000-01-01")
+        for i in range(3):
+            await Book.create(name=f"book{i}", author=author, cover="cover.png", rating=i)
+        await Role.create(name="role", age=1, desc="desc", gender="male", config={"a": 1})
+        for page_model, projection_model in (
+            (BookModel(prefix="book_p1"), BookProjectionModel(prefix="book_p2")),
+            (BookModel(prefix="book_p3"), BookLabelModel(prefix="book_p4")),
+            (RoleModel(prefix="role_p1"), RoleProjectionModel(prefix="role_p2")),
+        ):
+            data = await page_model.list(make_request(), 2, 1, "name", "desc")
+            projection = await projection_model.list(make_request(), 2, 1, "name", "desc")
+            self.assertEqual(data.total, projection.total)
+            self.assertEqual(data.items, projection.items)
+        page_model = BookLabelModel(prefix="book_p5")
+        self.assertEqual(("author_id", "author__name"), page_model.fields["author"].values_fields())
+
+
+class UpperStrControl(StrControl):
+    def orm_2_amis(self, value: Any) -> Any:
+        return value.upper()
+
+
+class BirthdayControl(DateControl):
+    async def get_value(self, request: Request, obj: Model) -> Any:
+        return "birthday"
+
+
+class TestRowSerializer(BaseSite):
+    async def test_serializer(self):
+        author = await Author.create(name="author", birthday="2000-01-02")
+        birthday = Author._meta.fields_map["birthday"]
+        fields = {
+            "birthday": BirthdayControl("", "birthday", False, None, field=birthday),
+            "name": UpperStrControl("", "name", False, None, field=Author._meta.fields_map["name"]),
+            "date": DateControl("", "birthday", False, None, field=birthday),
+            "pk": PkControl("pk", "pk", True, Any),
+        }
+        serializer = RowSerializer(fields)
+        data = await serializer(make_request(), author)
+        self.assertEqual(
+            {"birthday": "birthday", "name": "AUTHOR", "date": "2000-01-02", "pk": author.pk}, data
+        )
+        self.assertEqual(["birthday", "name", "date", "pk"], list(data))
+
+
+class EventModel(ModelAdmin):
+    model = Event
+    list_display = ("name", "tournament", "participants")
+    update_fields = ("name", "tournament", "participants")
+    label_fields = {"participants": "name"}
+
+
+class TournamentEventsControl(StrControl):
+    async def get_value(self, request: Request, obj: Model) -> Any:
+        return await Event.filter(tournament_id=obj.pk).count()
+
+
+class TournamentModel(ModelAdmin):
+    model = Tournament
+    list_display = ("name", "events")
+    fields = {"events": TournamentEventsControl("events", "events", True, None)}
+
+
+class TestPrefetch(BaseSite):
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self.tournament = await Tournament.create(name="tournament")
+        team1 = await Team.create(name="team1")
+        team2 = await Team.create(name="team2")
+        for i in range(3):
+            event = await Event.create(name=f"event{i}", tournament=self.tournament)
+            await event.participants.add(team1, team2)
+        self.event = event
+
+    async def test_prefetch(self):
+        page_model = EventModel(prefix="event_prefetch")
+        select_list, prefetch_list, queries = page_model.get_prefetch_plan(
+            make_request(), page_model.get_update_fields()
+        )
+        self.assertEqual(["tournament"], select_list)
+        self.assertEqual(1, queries)
+        # 编辑页的多对多字段不预加载，只从中间表读取主键
+        with QueryCounter() as counter:
+            data = await page_model.get_update(make_request(), self.event.pk)
+        self.assertEqual(2, counter.count)
+        self.assertEqual({"label": "tournament", "value": self.tournament.pk}, data["tournament"])
+        self.assertEqual([1, 2], data["participants"])
+        # 列表页的多对多字段只查询数量
+        self.assertEqual(4, page_model.get_list_query_plan(make_request()))
+        with patch.object(settings, "LIST_QUERY_CHECK", True):
+            data = await page_model.list(make_request(), 10, 1)
+            self.assertEqual(3, data.total)
+            self.assertEqual([2, 2, 2], [i["participants"] for i in data.items])
+            await Tournament.create(name="tournament2")
+            page_model = TournamentModel(prefix="tournament_prefetch")
+            with self.assertRaises(AssertionError):
+                await page_model.list(make_request(), 10, 1)
+
+    async def test_many_selects(self):
+        page_model = EventModel(prefix="event_selects")
+        team3 = await Team.create(name="other")
+        await self.event.participants.add(team3)
+        data = await page_model.select_options(make_request(), "participants", self.event.pk, 2, 2)
+        self.assertEqual(3, data.total)
+        self.assertEqual([{"value": team3.pk, "label": "other"}], data.items)
+        data = await page_model.select_options(
+            make_request(), "participants", self.event.pk, 2, 1, "team"
+        )
+        self.assertEqual(2, data.total)
+        self.assertEqual(["team1", "team2"], [i["label"] for i in data.items])
+        # 表单中的选项分页搜索，已选择的值按主键查询
+        data = await page_model.select_options(make_request(), "participants", None, 2, 2)
+        self.assertEqual([{"value": team3.pk, "label": "other"}], data["options"])
+        data = await page_model.select_options(
+            make_request(), "participants", None, None, None, "oth"
+        )
+        self.assertEqual([{"value": team3.pk, "label": "other"}], data["options"])
+        # 穿梭框的选项带上不在当前页的选中值
+        data = await page_model.select_options(
+            make_request(value=f"1,{team3.pk}"), "participants", None, 1, 1
+        )
+        self.assertEqual(
+            [{"value": 1, "label": "team1"}, {"value": team3.pk, "label": "other"}],
+            data["options"],
+        )
+        control = page_model.fields["participants"].get_formitem(make_request(), [])
+        self.assertEqual(
+            "get:event_selects/select/participants?perPage=20&value=${participants|join}",
+            control.source,
+        )
+        self.assertEqual(
+            "get:event_selects/select/participants?perPage=20&term=$term", control.searchApi
+        )
+
+    async def test_many_update(self):
+        page_model = EventModel(prefix="event_many_update")
+        team3 = await Team.create(name="team3")
+        team1, team2 = await self.event.participants.all().order_by("id")
+        data = {"name": "event", "tournament": self.tournament.pk}
+        # 中间表比较主键集合之后只写入变化的部分
+        with QueryCounter() as counter:
+            await page_model.update(
+                make_request(),
+                self.event.pk,
+                {**data, "participants": [{"value": team2.pk}, {"value": team3.pk}, {"value": 0}]},
+            )
+        self.assertEqual(
+            [team2.pk, team3.pk],
+            sorted(await self.event.participants.all().values_list("id", flat=True)),
+        )
+        # 读取对象、校验主键、读取中间表、删除、新增、更新对象各一条，外键没有修改不需要校验
+        self.assertEqual(6, counter.count)
+        await page_model.update(make_request(), self.event.pk, {**data, "participants": ""})
+        self.assertEqual(0, await self.event.participants.all().count())
+        self.assertEqual(2, await team1.events.all().count())
+        # 外键直接写入id，不存在的时候通过FieldsError返回
+        tournament = await Tournament.create(name="tournament2")
+        with QueryCounter() as counter:
+            await page_model.update(
+                make_request(),
+                self.event.pk,
+                {**data, "tournament": {"value": tournament.pk}, "participants": []},
+            )
+        self.assertEqual(4, counter.count)
+        self.assertEqual(tournament.pk, (await Event.get(pk=self.event.pk)).tournament_id)
+        with self.assertRaises(FieldsError) as e:
+            await page_model.update(
+                make_request(),
+                self.event.pk,
+                {**data, "tournament": 0, "participants": [{"value": team1.pk}]},
+            )
+        self.assertIn("tournament", e.exception.detail)
+        # 校验失败的时候已经写入的中间表也要回滚
+        self.assertEqual(0, await self.event.participants.all().count())
+
+    async def test_update_changed(self):
+        page_model = EventModel(prefix="event_update_changed")
+        event = await Event.get(pk=self.event.pk)
+        data = {"name": event.name, "tournament": self.tournament.pk}
+        # 没有修改的时候不写入
+        with QueryCounter() as counter:
+            await page_model.update(make_request(), event.pk, data)
+        self.assertEqual(1, counter.count)
+        self.assertEqual(event.modified, (await Event.get(pk=event.pk)).modified)
+        # 只写入修改的字段和auto_now的字段
+        await Event.filter(pk=event.pk).update(token="token")
+        with patch.object(Event, "save", autospec=True, side_effect=Event.save) as save:
+            obj = await page_model.update(make_request(), event.pk, {**data, "name": "renamed"})
+        self.assertEqual(["name", "modified"], save.call_args.kwargs["update_fields"])
+        event = await Event.get(pk=event.pk)
+        self.assertEqual(("renamed", "token"), (event.name, event.token))
+        self.assertEqual(obj.modified, event.modified)
+
+
+class TestPatch(BaseSite):
+    async def test_fast_patch(self):
+        author = await Author.create(name="author", birthday="2000-01-01")
+        page_model = AuthorModel(prefix="author_patch")
+        with QueryCounter() as counter:
+            self.assertIsNone(await page_model.patch(make_request(), author.pk, {"name": "a"}))
+        self.assertEqual(1, counter.count)
+        self.assertEqual("a", (await Author.get(pk=author.pk)).name)
+        with self.assertRaises(NotFoundError):
+            await page_model.patch(make_request(), "0", {"name": "a"})
+        # 和set_value一样按照请求方法传入is_create
+        with patch.object(StrControl, "validate", autospec=True, return_value="b") as validate:
+            await page_model.patch(make_request("POST"), author.pk, {"name": "b"})
+        self.assertTrue(validate.call_args.kwargs["is_create"])
+        # 和读取对象再保存的结果一致
+        await Role.create(name="role", age=1, desc="desc", gender="male", config={"a": 1})
+        role = await Role.create(name="role", age=1, desc="desc", gender="male", config={"a": 1})
+        page_model = RoleModel(prefix="role_patch")
+        data = await page_model.get_update(make_request(), role.pk)
+        data.update(name="new", age=2, married="True", config='{"b": 2}', money=1.5)
+        self.assertTrue(page_model.is_plain_patch(page_model.get_update_fields()))
+        await page_model.patch(make_request(), role.pk, data)
+        with patch.object(RoleModel, "is_plain_patch", return_value=False):
+            self.assertIsNotNone(await page_model.patch(make_request(), role.pk - 1, data))
+        old, new = await Role.filter(pk__in=[role.pk - 1, role.pk]).order_by("id").values()
+        self.assertLess(role.update_time, new["update_time"])
+        for row in (old, new):
+            row.pop("id")
+            row.pop("uuid")
+            row.pop("update_time")
+            row.pop("create_time")
+        self.assertEqual(old, new)
+        self.assertEqual({"b": 2}, new["config"])
+
+    async def test_patch_many(self):
+        roles = [
+            await Role.create(name=f"role{i}", age=i, desc="desc", gender="male") for i in range(3)
+        ]
+        page_model = RoleBulkModel(prefix="role_patch_many")
+        rows = [
+            {"pk": roles[0].pk, "name": "a", "age": 5},
+            {"pk": roles[1].pk, "name": "b"},
+            {"pk": roles[2].pk, "married": "True", "config": '{"c": 1}', "money": 2.5},
+        ]
+        # 检查主键一次，每组修改的字段各一次bulk_update
+        with QueryCounter() as counter:
+            await page_model.patch_many(make_request(), rows)
+        self.assertEqual(4, counter.count)
+        data = await Role.filter(pk__in=[i.pk for i in roles]).order_by("id")
+        self.assertEqual(["a", "b", "role2"], [i.name for i in data])
+        self.assertEqual([5, 1, 2], [i.age for i in data])
+        self.assertEqual([False, False, True], [i.married for i in data])
+        self.assertEqual(({"c": 1}, Decimal("2.5")), (data[2].config, data[2].money))
+        self.assertLess(roles[2].update_time, data[2].update_time)
+        # 所有行校验通过才会写入
+        with self.assertRaises(FieldsError) as e:
+            await page_model.patch_many(
+                make_request(),
+                [{"pk": roles[0].pk, "name": "c"}, {"pk": 0, "name": "d"}],
+            )
+        self.assertIn('"0.pk"', e.exception.detail)
+        self.assertEqual("a", (await Role.get(pk=roles[0].pk)).name)
+        with patch.object(StrControl, "validate", autospec=True, return_value="e") as validate:
+            await page_model.patch_many(make_request("POST"), [{"pk": roles[0].pk, "name": "e"}])
+        self.assertTrue(validate.call_args.kwargs["is_create"])
+        crud = page_model.get_crud(make_request(), ["role_patch_many_list"])[0]
+        self.assertEqual("role_patch_many/patch", crud.quickSaveApi)
+        self.assertEqual("pk", crud.primaryField)
+        self.assertFalse(crud.columns[0].quickEdit.saveImmediately)
+
+
+class RoleBulkModel(RoleModel):
+    bulk_quick_save = True
+
+
+class AuthorBulkModel(AuthorModel):
+    methods = AuthorModel.methods + ("deleteMany",)
+    filters = ("name",)
+    bulk_update_fields = ("birthday",)
+
+
+class TestBulkAction(BaseSite):
+    async def test_bulk_action(self):
+        authors = [await Author.create(name=f"author{i}", birthday="2000-01-01") for i in range(5)]
+        page_model = AuthorBulkModel(prefix="author_bulk")
+        ids = f"{authors[0].pk},{authors[1].pk}"
+        count = await page_model.bulk_action(
+            make_request(ids=ids), "update", {"birthday": "2001-01-01"}
+        )
+        self.assertEqual(2, count)
+        # 全选的时候操作所有符合过滤条件的数据
+        count = await page_model.bulk_action(
+            make_request(all="true", name="author4"), "update", {"birthday": "2002-01-01"}
+        )
+        self.assertEqual(1, count)
+        birthdays = await Author.all().order_by("id").values_list("birthday", flat=True)
+        self.assertEqual(
+            ["2001-01-01", "2001-01-01", "2000-01-01", "2000-01-01", "2002-01-01"],
+            [str(i) for i in birthdays],
+        )
+        with patch.object(DateControl, "validate", autospec=True) as validate:
+            validate.return_value = datetime.date(2003, 1, 1)
+            await page_model.bulk_action(
+                make_request("POST", ids=ids), "update", {"birthday": "2003-01-01"}
+            )
+        self.assertTrue(validate.call_args.kwargs["is_create"])
+        with self.assertRaises(NotFoundError):
+            await page_model.bulk_action(make_request(ids=ids), "unknown", {})
+        # 分批查询主键和删除
+        with patch.object(settings, "BULK_ACTION_CHUNK_SIZE", 2):
+            with QueryCounter() as counter:
+                count = await page_model.bulk_action(
+                    make_request(all="true", name=""), "delete", {}
+                )
+        self.assertEqual(5, count)
+        self.assertEqual(6, counter.count)
+        self.assertEqual(0, await Author.all().count())
+        crud = page_model.get_crud(make_request(), ["author_bulk_update", "author_bulk_delete"])[0]
+        self.assertEqual(
+            [
+                "post:author_bulk/bulk/delete?ids=${ids|raw}",
+                "post:author_bulk/bulk/delete?all=true&name=${name}",
+            ],
+            [i.api for i in crud.bulkActions if i.label.startswith("删除")],
+        )
+        self.assertEqual(4, len(crud.bulkActions))
+        self.assertIsNone(crud.bulkActions[1].dialog.body.body[0].required)
+
+
+class BookSelectModel(BookModel):
+    label_fields = {"author": "name"}
+    select_search_fields = {"author": ("name",)}
+
+
+class TestForeignKeySelect(BaseSite):
+    async def test_selects(self):
+        await Author.bulk_create(
+            [Author(name=f"author{i:02}", birthday="2000-01-01") for i in range(30)]
+        )
+        page_model = BookSelectModel(prefix="book_selects")
+        # 默认只返回一页选项
+        data = await page_model.select_options(make_request(), "author", None, None, None)
+        self.assertEqual(settings.SELECT_PAGE_SIZE, len(data["options"]))
+        data = await page_model.select_options(make_request(), "author", None, 5, 2)
+        self.assertEqual(
+            [f"author{i:02}" for i in range(5, 10)], [i["label"] for i in data["options"]]
+        )
+        data = await page_model.select_options(make_request(), "author", None, None, None, "r2")
+        self.assertEqual(
+            [f"author{i:02}" for i in range(20, 30)], [i["label"] for i in data["options"]]
+        )
+        # 不在当前页的选中值一起返回，无法转换的值忽略
+        data = await page_model.select_options(
+            make_request(value="2,29,30,[object Object]"), "author", None, 5, 1
+        )
+        self.assertEqual(
+            [{"value": 29, "label": "author28"}, {"value": 30, "label": "author29"}],
+            data["options"][5:],
+        )
+        self.assertEqual(7, len(data["options"]))
+        control = page_model.fields["author"].get_formitem(make_request(), [])
+        self.assertEqual(
+            "get:book_selects/select/author?perPage=20&value=${author.value || author}",
+            control.source,
+        )
+        self.assertEqual(
+            "get:book_selects/select/author?perPage=20&term=$term", control.autoComplete
+        )
+
+    async def test_one_to_one(self):
+        tournament = await Tournament.create(name="tournament")
+        events = [await Event.create(name=f"event{i}", tournament=tournament) for i in range(4)]
+        await Address.create(city="city", street="street", event=events[1])
+        page_model = AddressModel(prefix="address_selects")
+        # 已经被关联的对象不能再选择
+        data = await page_model.select_options(make_request(), "event", None, 2, 1)
+        self.assertEqual(["event0", "event2"], [i["label"] for i in data["options"]])
+        data = await page_model.select_options(make_request(), "event", None, None, None, "event3")
+        self.assertEqual(["event3"], [i["label"] for i in data["options"]])
+        # 没有声明搜索字段的时候不会模糊搜索字符串字段，只按主键匹配
+        plain_model = AddressPlainModel(prefix="address_plain_selects")
+        data = await plain_model.select_options(make_request(), "event", None, None, None, "event3")
+        self.assertEqual([], data["options"])
+        term = str(events[3].pk)
+        data = await plain_model.select_options(make_request(), "event", None, None, None, term)
+        self.assertEqual([events[3].pk], [i["value"] for i in data["options"]])
+
+    async def test_backward_one_to_one(self):
+        page_model = EventAddressModel(prefix="event_address")
+        control = page_model.fields["address"].get_formitem(make_request(), [])
+        self.assertEqual(
+            "get:event_address/select/address?perPage=20&value=${address.value || address}",
+            control.source,
+        )
+
+    async def test_search_pk(self):
+        tickets = [await Ticket.create(name=f"ticket{i}") for i in range(2)]
+        queryset = search_queryset(Ticket.all(), str(tickets[1].pk))
+        self.assertEqual([tickets[1].pk], [i.pk for i in await queryset])
+        self.assertEqual([], await search_queryset(Ticket.all(), "ticket1"))
+        self.assertEqual([], await search_queryset(Event.all(), "event1"))
+
+    async def test_builtin_admin(self):
+        await User.bulk_create(
+            [User(username=f"user{i:02}", name=f"name{i:02}", password="") for i in range(30)]
+        )
+        page_model = GroupAdmin(prefix="group_selects")
+        # 内置的admin声明了搜索字段，超出第一页的用户可以通过用户名或者名称搜索
+        data = await page_model.select_options(make_request(), "users", None, None, None, "user25")
+        self.assertEqual(["name25"], [i["label"] for i in data["options"]])
+        data = await page_model.select_options(make_request(), "users", None, None, None, "name2")
+        self.assertEqual(10, len(data["options"]))
+        data = await page_model.select_options(make_request(), "users", None, None, None, "hash")
+        self.assertEqual([], data["options"])
+
+
+class AddressPlainModel(ModelAdmin):
+    model = Address
+    list_display = ("city", "street", "event")
+    create_fields = ("city", "street", "event")
+
+
+class EventAddressModel(ModelAdmin):
+    model = Event
+    list_display = ("name",)
+    update_fields = ("name", "address")
+
+
+class AddressModel(AddressPlainModel):
+    select_search_fields = {"event": ("name",)}
@@ -1,4 +1,5 @@
 from datetime import timedelta
+from unittest.mock import patch
 
 from tortoise.expressions import Q
 
@@ -349,7 +350,14 @@ class TestPermission(BaseSite):
         response = await self.client.get("/admin/group/list")
         self.assertEqual(
             response.json(),
-            {"status": 0, "msg": "", "data": {"items": [{"name": "group3", "pk": 1}], "total": 1}},
+            {
+                "status": 0,
+                "msg": "",
+                "data": {
+                    "items": [{"name": "group3", "pk": 1, "users": 2, "permissions": 12}],
+                    "total": 1,
+                },
+            },
         )
         response = await self.client.get(f"/admin/group/select/users?pk={group.pk}")
         self.assertEqual(
@@ -384,3 +392,205 @@ class TestPermission(BaseSite):
             }
         )
         self.assertEqual(new_all_perms, perms2)
+
+    async def test_user_cache(self):
+        """
+        测试登录用户缓存，以及用户修改之后缓存失效
+        """
+        import tempfile
+        import threading
+
+        from fast_tmp.admin import depends
+        from fast_tmp.admin.depends import USER_VERSION, user_cache
+        from fast_tmp.utils.backends import SQLiteBackend
+
+        user: User = await self.create_user("user5")
+        await self.login("user5")
+        # 没有配置USER_CACHE_BACKEND的时候不缓存
+        hits, misses = user_cache.hits, user_cache.misses
+        response = await self.client.get("/admin/site")
+        self.assertEqual(200, response.status_code)
+        self.assertEqual((hits, misses), (user_cache.hits, user_cache.misses))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = tmpdir + "/state.db"
+            worker1, worker2 = SQLiteBackend(path), SQLiteBackend(path)
+            with patch.object(depends, "user_backend", worker1):
+                response = await self.client.get("/admin/site")
+                self.assertEqual(200, response.status_code)
+                hits = user_cache.hits
+                response = await self.client.get("/admin/site")
+                self.assertEqual(200, response.status_code)
+                self.assertEqual(hits + 1, user_cache.hits)
+                # 其他worker修改用户之后版本号变化，本地的缓存失效
+                await User.filter(pk=user.pk).update(is_active=False)
+                worker2.incr_version(USER_VERSION)
+                response = await self.client.get("/admin/site")
+                self.assertEqual(302, response.status_code)
+                # 保存用户会刷新共享的版本号，sqlite的写入在线程池中执行
+                version = worker2.get_version(USER_VERSION)
+                threads = []
+                incr_version = worker1.incr_version
+
+                def record_thread(name):
+                    threads.append(threading.get_ident())
+                    return incr_version(name)
+
+                with patch.object(worker1, "incr_version", record_thread):
+                    await user.save()
+                self.assertGreater(worker2.get_version(USER_VERSION), version)
+                self.assertEqual(1, len(threads))
+                self.assertNotEqual(threading.get_ident(), threads[0])
+
+    async def test_permission_cache(self):
+        """
+        测试多个worker共享版本号的权限缓存
+        """
+        import tempfile
+        import threading
+
+        from fast_tmp.contrib.auth import permissions
+        from fast_tmp.contrib.auth.permissions import PermissionCache
+        from fast_tmp.utils.backends import SQLiteBackend
+
+        old_cache = permissions.permission_cache
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = tmpdir + "/state.db"
+            worker1 = PermissionCache(SQLiteBackend(path))
+            worker2 = PermissionCache(SQLiteBackend(path))
+            permissions.permission_cache = worker1
+            try:
+                user: User = await self.create_user("user6")
+                group = Group(name="group6")
+                await group.save()
+                await group.users.add(user)
+                await group.permissions.add(await Permission.get(codename="book_list"))
+                await permissions.bump_rbac_version()
+                self.assertTrue(await user.has_perm("book_list"))
+                # 直接修改多对多不会刷新缓存
+                await group.permissions.clear()
+                self.assertTrue(await user.has_perm("book_list"))
+                # 其他worker刷新版本号之后缓存失效
+                await worker2.bump()
+                self.assertFalse(await user.has_perm("book_list"))
+                # 通过admin修改组会刷新版本号
+                await self.login()
+                version = await worker1.version()
+                perms = await Permission.filter(codename__startswith="book")
+                response = await self.client.put(
+                    f"/admin/group/update/{group.pk}",
+                    json={
+                        "name": "group6",
+                        "users": [{"value": user.pk}],
+                        "permissions": [{"value": p.pk} for p in perms],
+                    },
+                )
+                self.assertEqual(200, response.status_code)
+                self.assertGreater(await worker2.version(), version)
+                self.assertEqual(
+                    {"book_list", "book_create"},
+                    await user.get_perms({"book_list", "book_create", "user_list"}),
+                )
+                # sqlite的读写在线程池中执行，不阻塞事件循环
+                threads = []
+                get_version = worker1.backend.get_version
+
+                def record_thread(name):
+                    threads.append(threading.get_ident())
+                    return get_version(name)
+
+                with patch.object(worker1.backend, "get_version", record_thread):
+                    await worker1.version()
+                self.assertEqual(1, len(threads))
+                self.assertNotEqual(threading.get_ident(), threads[0])
+            finally:
+                permissions.permission_cache = old_cache
+
+    async def test_token_cache(self):
+        """
+        测试token解析缓存
+        """
+        import time
+
+        from fast_tmp.utils.token import decode_access_token, token_cache
+
+        token = create_access_token(data={"sub": "admin"}, expires_delta=timedelta(minutes=10))
+        hits, misses = token_cache.hits, token_cache.misses
+        self.assertEqual("admin", decode_access_token(token)["sub"])
+        self.assertEqual("admin", decode_access_token(token)["sub"])
+        self.assertEqual((hits + 1, misses + 1), (token_cache.hits, token_cache.misses))
+        # 过期的token不能从缓存返回
+        token = create_access_token(data={"sub": "admin"}, expires_delta=timedelta(seconds=1))
+        decode_access_token(token)
+        self.assertIn(token, token_cache)
+        with patch("time.time", return_value=time.time() + 2):
+            self.assertNotIn(token, token_cache)
+
+    async def test_perm_claim(self):
+        """
+        测试把权限写入token
+        """
+        from fast_tmp.conf import settings
+        from fast_tmp.contrib.auth import permissions
+        from fast_tmp.contrib.auth.permissions import PermissionCache
+        from fast_tmp.utils.backends import MemoryBackend
+        from fast_tmp.utils.token import decode_access_token
+
+        cache = PermissionCache(MemoryBackend())
+        with patch.object(permissions, "permission_cache", cache), patch.object(
+            settings, "TOKEN_PERMISSION_CLAIM", True
+        ):
+            user: User = await self.create_user("user7")
+            group = Group(name="group7")
+            await group.save()
+            await group.users.add(user)
+            await group.permissions.add(*await Permission.filter(codename__startswith="book"))
+            await self.login("user7")
+            payload = decode_access_token(self.client.cookies["access_token"])
+            self.assertEqual(await permissions.rbac_version(), payload["perm"]["v"])
+            # 直接修改数据库，但是版本号没有变化，权限从token读取
+            await group.permissions.clear()
+            response = await self.client.get("/admin/site")
+            self.assertEqual(2, len(response.json()["data"]["pages"]))
+            self.assertNotIn("set-cookie", response.headers)
+            # 版本号变化之后从数据库读取并重新签发token
+            await permissions.bump_rbac_version()
+            response = await self.client.get("/admin/site")
+            self.assertEqual([], response.json()["data"]["pages"])
+            self.assertIn("set-cookie", response.headers)
+            payload = decode_access_token(self.client.cookies["access_token"])
+            self.assertEqual(await permissions.rbac_version(), payload["perm"]["v"])
+            response = await self.client.get("/admin/site")
+            self.assertNotIn("set-cookie", response.headers)
+
+    async def test_token_refresh(self):
+        """
+        测试token自动续签
+        """
+        from fast_tmp.conf import settings
+        from fast_tmp.utils.token import decode_access_token
+
+        await self.login()
+        old_payload = decode_access_token(self.client.cookies["access_token"])
+        response = await self.client.get("/admin/site")
+        self.assertNotIn("set-cookie", response.headers)
+        with patch.object(settings, "ACCESS_TOKEN_REFRESH_RATIO", 1e-9):
+            response = await self.client.get("/admin/site")
+        self.assertEqual(200, response.status_code)
+        self.assertIn("set-cookie", response.headers)
+        payload = decode_access_token(self.client.cookies["access_token"])
+        self.assertGreater(payload["create_time"], old_payload["create_time"])
+        self.assertGreater(payload["exp"], old_payload["exp"])
+        # 缓存中的用户没有及时失效的时候，续签之前从数据库确认用户状态
+        await self.client.get("/admin/site")
+        await User.filter(username="admin").update(is_active=False)
+        with patch.object(settings, "ACCESS_TOKEN_REFRESH_RATIO", 1e-9):
+            response = await self.client.get("/admin/site")
+        self.assertEqual(302, response.status_code)
+        self.assertNotIn("set-cookie", response.headers)
+        await User.filter(username="admin").update(is_active=True)
+        # 修改密码之后，续签的token同样失效
+        user = await User.get(username="admin")
+        user.set_password("654321")
+        await user.save()
+        response = await self.client.get("/admin/site")
+        self.assertEqual(302, response.status_code)
@@ -115,6 +115,14 @@ class Address(Model):
     )
 
 
+class Ticket(Model):
+    id = fields.UUIDField(pk=True)
+    name = fields.CharField(max_length=64)
+
+    class Meta:
+        ordering = ["name"]
+
+
 class Team(Model):
     """
     Team that is a playing